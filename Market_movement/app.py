@@ -1,18 +1,131 @@
 from flask import Flask, request, jsonify, send_from_directory
-from transformers import pipeline
-import yfinance as yf
 import re
 import os
+import time
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
 app = Flask(__name__)
 
 # ------------------ LOAD MODEL ------------------
-print("Loading FinBERT model... Please wait (first run may take several minutes)")
-sentiment_pipeline = pipeline(
-    "sentiment-analysis",
-    model="ProsusAI/finbert"
+# transformers/torch and the FinBERT weights take seconds to load, so they are
+# loaded by a background warmup thread (or on first use) rather than at import.
+# PRELOAD_MODEL=true loads them at import instead, for gunicorn's preload_app:
+# workers forked from the master then share the weights copy-on-write.
+PRELOAD_MODEL = os.environ.get("PRELOAD_MODEL", "false").lower() == "true"
+sentiment_pipeline = None
+PIPELINE_LOCK = threading.Lock()
+
+def get_pipeline():
+    """Load FinBERT on first use"""
+    global sentiment_pipeline
+    if sentiment_pipeline is None:
+        with PIPELINE_LOCK:
+            if sentiment_pipeline is None:
+                from transformers import pipeline
+                print("Loading FinBERT model... Please wait (first run may take several minutes)")
+                sentiment_pipeline = pipeline(
+                    "sentiment-analysis",
+                    model="ProsusAI/finbert"
+                )
+                print("FinBERT model loaded successfully")
+    return sentiment_pipeline
+
+if PRELOAD_MODEL:
+    get_pipeline()
+
+# ------------------ MICRO-BATCHING SCHEDULER ------------------
+MICROBATCH_MAX_SIZE = int(os.environ.get("MICROBATCH_MAX_SIZE", 32))
+MICROBATCH_MAX_WAIT_MS = float(os.environ.get("MICROBATCH_MAX_WAIT_MS", 5))
+
+class MicroBatcher:
+    """Coalesce model calls from concurrent requests into shared batches.
+
+    Callers block in submit() while a worker thread gathers queued jobs
+    until `max_batch_size` inputs are waiting or `max_wait` seconds have
+    passed since the first one, then runs them through `batch_fn` as one
+    call and hands each caller its own slice of the results.
+    """
+
+    def __init__(self, batch_fn, max_batch_size, max_wait, concurrency=1):
+        self.batch_fn = batch_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.concurrency = concurrency
+        self.lock = threading.Lock()
+        self.pid = None
+
+    def ensure_worker(self):
+        # Started lazily (and again after a fork) since threads don't survive fork()
+        if self.pid == os.getpid():
+            return
+        with self.lock:
+            if self.pid != os.getpid():
+                self.queue = queue.Queue()
+                self.executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="microbatch")
+                threading.Thread(target=self.run, daemon=True, name="microbatch-scheduler").start()
+                self.pid = os.getpid()
+
+    def submit(self, inputs):
+        self.ensure_worker()
+        job = {"inputs": inputs, "done": threading.Event(), "result": None, "error": None}
+        self.queue.put(job)
+        job["done"].wait()
+        if job["error"] is not None:
+            raise job["error"]
+        return job["result"]
+
+    def run(self):
+        carry = None
+        while True:
+            jobs = [carry or self.queue.get()]
+            carry = None
+            size = len(jobs[0]["inputs"])
+            deadline = time.monotonic() + self.max_wait
+            while size < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    job = self.queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if size + len(job["inputs"]) > self.max_batch_size:
+                    carry = job  # Would overflow the batch: it starts the next one
+                    break
+                jobs.append(job)
+                size += len(job["inputs"])
+            self.executor.submit(self.flush, jobs)
+
+    def flush(self, jobs):
+        inputs = [text for job in jobs for text in job["inputs"]]
+        try:
+            outputs = self.batch_fn(inputs)
+        except Exception as e:
+            outputs, error = None, e
+
+        offset = 0
+        for job in jobs:
+            count = len(job["inputs"])
+            if outputs is None:
+                job["error"] = error
+            else:
+                job["result"] = outputs[offset:offset + count]
+            offset += count
+            job["done"].set()
+
+PIPELINE_BATCHER = MicroBatcher(
+    lambda texts: get_pipeline()(texts, batch_size=len(texts)),
+    MICROBATCH_MAX_SIZE, MICROBATCH_MAX_WAIT_MS / 1000
 )
-print("FinBERT model loaded successfully")
+
+def score_texts(texts):
+    """Run texts through FinBERT, sharing a batch with concurrent requests"""
+    return PIPELINE_BATCHER.submit(texts)
+
+def score_text(text):
+    return score_texts([text])[0]
 
 # ------------------ COMPANY TO TICKER MAPPING ------------------
 COMPANY_TICKERS = {
@@ -159,13 +272,12 @@ def analyze_sentiment_trend(text):
     if len(paragraphs) < 2:
         return None
     
-    sentiments = []
-    for para in paragraphs[:5]:  # Analyze up to 5 paragraphs
-        try:
-            result = sentiment_pipeline(para[:512])[0]
-            sentiments.append(result['label'].lower())
-        except:
-            continue
+    # Analyze up to 5 paragraphs, all in one model call
+    try:
+        results = score_texts([para[:512] for para in paragraphs[:5]])
+    except Exception:
+        return None
+    sentiments = [result['label'].lower() for result in results]
     
     if len(sentiments) < 2:
         return None
@@ -214,7 +326,7 @@ def analyze():
         return jsonify({"error": "Text input is required"}), 400
 
     text = data['text']
-    result = sentiment_pipeline(text[:512])[0]
+    result = score_text(text[:512])
     label = result['label'].lower()
     score = result['score']
     confidence = round(score * 100, 2)
@@ -241,6 +353,7 @@ def analyze():
     
     if detected_ticker:
         try:
+            import yfinance as yf
             ticker = yf.Ticker(detected_ticker)
             info = ticker.info
             
@@ -285,6 +398,7 @@ def get_stock(symbol):
     period = request.args.get('period', '1mo')
     
     try:
+        import yfinance as yf
         ticker = yf.Ticker(symbol.upper())
         info = ticker.info
         
@@ -314,6 +428,56 @@ def get_stock(symbol):
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+# ------------------ WARMUP & HEALTH ------------------
+# Each worker loads the model in a background thread right after start, so
+# /health can report readiness. Set WARMUP=false to load on first request.
+WARMUP_ENABLED = os.environ.get("WARMUP", "true").lower() != "false"
+WARMUP_STATE = {"pid": None, "seconds": None, "error": None}
+WARMUP_LOCK = threading.Lock()
+
+def warm_up():
+    start = time.time()
+    try:
+        import yfinance  # noqa: F401
+        get_pipeline()("Warmup")
+    except Exception as e:
+        print(f"Warmup Error: {e}")
+        WARMUP_STATE["error"] = str(e)
+    WARMUP_STATE["seconds"] = round(time.time() - start, 3)
+    print(f"Worker {os.getpid()} warm in {WARMUP_STATE['seconds']}s")
+
+def start_warmup():
+    """Start warm_up in a background thread, once per process"""
+    if not WARMUP_ENABLED or WARMUP_STATE["pid"] == os.getpid():
+        return
+    with WARMUP_LOCK:
+        if WARMUP_STATE["pid"] == os.getpid():
+            return
+        # Threads don't survive fork(), so a forked worker starts its own
+        WARMUP_STATE.update(pid=os.getpid(), seconds=None, error=None)
+    threading.Thread(target=warm_up, daemon=True, name="warmup").start()
+
+@app.before_request
+def ensure_warmup():
+    start_warmup()
+
+@app.route('/health')
+def health():
+    """Readiness: 200 once the model is loaded, 503 while warming"""
+    start_warmup()
+    if sentiment_pipeline is not None:
+        model = "loaded"
+    else:
+        model = "error" if WARMUP_STATE["error"] else "loading"
+    ready = model == "loaded" or not WARMUP_ENABLED
+    return jsonify({
+        "status": "ready" if ready else ("error" if WARMUP_STATE["error"] else "warming"),
+        "pid": os.getpid(),
+        "model": model,
+        "warmup_seconds": WARMUP_STATE["seconds"],
+        "error": WARMUP_STATE["error"],
+    }), 200 if ready else 503
+
 # ------------------ RUN SERVER ------------------
 if __name__ == '__main__':
     print("Starting Flask server...")
@@ -0,0 +1,20 @@
+# Gunicorn settings, picked up automatically by `gunicorn app:app`
+# (Procfile and Dockerfile).
+#
+# PRELOAD_MODEL=true loads FinBERT once in the master so forked workers share
+# the weights copy-on-write; otherwise each worker starts fast and loads the
+# model in a background thread (see /health).
+#
+# Workers are threaded so that concurrent requests in one process can share
+# model batches (see MicroBatcher); a sync worker would serve one at a time.
+import os
+
+worker_class = os.environ.get("GUNICORN_WORKER_CLASS", "gthread")
+workers = int(os.environ.get("WEB_CONCURRENCY", 1))
+threads = int(os.environ.get("WEB_THREADS", 16))
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 120))
+preload_app = os.environ.get("PRELOAD_MODEL", "false").lower() == "true"
+
+def post_worker_init(worker):
+    import app
+    app.start_warmup()
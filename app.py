@@ -1,16 +1,223 @@
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, Response, g, request, jsonify, send_from_directory, stream_with_context
 import re
 import os
+import json
+import hashlib
+import threading
+import queue
+import sqlite3
+import tempfile
+import fcntl
+import csv
+import gzip
+import bisect
+import functools
+import contextvars
+import importlib
 import requests
-import yfinance as yf
+import requests.adapters
 import time
+from collections import Counter, OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError, wait
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
+
+class LazyModule:
+    """Module placeholder that imports the real module on first attribute access"""
+
+    def __init__(self, name, alias):
+        self.name = name
+        self.alias = alias
+        self.module = None
+
+    @property
+    def loaded(self):
+        return self.module is not None
+
+    def load(self):
+        if self.module is None:
+            self.module = importlib.import_module(self.name)  # the import lock serialises racing threads
+            # Swap the real module in, unless something (e.g. the bench fakes) replaced the global
+            if globals().get(self.alias) is self:
+                globals()[self.alias] = self.module
+        return self.module
+
+    def __getattr__(self, attr):
+        return getattr(self.load(), attr)
+
+# yfinance and pandas are most of the import time, so they load on first use
+# or in the warmup thread (see WARMUP & HEALTH) instead of at worker start
+yf = LazyModule("yfinance", "yf")
+np = LazyModule("numpy", "np")
+pd = LazyModule("pandas", "pd")
+LAZY_MODULES = (yf, np, pd)
 
 # ------------------ CACHE CONFIG ------------------
-STOCK_CACHE = {}
-CACHE_DURATION = 300  # 5 minutes in seconds
+# "sqlite" is shared by every gunicorn worker on the host, "memory" is per process
+STOCK_CACHE_BACKEND = os.environ.get("STOCK_CACHE_BACKEND", "sqlite").lower()
+STOCK_CACHE_PATH = os.environ.get("STOCK_CACHE_PATH", os.path.join(tempfile.gettempdir(), "market_movement_cache.sqlite"))
+STOCK_CACHE_MAX_ENTRIES = int(os.environ.get("STOCK_CACHE_MAX_ENTRIES", 2000))
+# How stale an entry's last-access time may get before a hit rewrites it (sqlite)
+STOCK_CACHE_TOUCH_SECONDS = float(os.environ.get("STOCK_CACHE_TOUCH_SECONDS", 60))
 
 app = Flask(__name__)
 
+# ------------------ METRICS ------------------
+# Process-local counters and stage-timing histograms, exposed on /metrics in
+# the Prometheus text format. A request sent with `X-Profile: 1` also gets a
+# Server-Timing header with the time it spent in each stage.
+METRIC_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+REQUEST_PROFILE = contextvars.ContextVar("request_profile", default=None)
+
+class Metrics:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.lock = threading.Lock()
+        self.counters = {}  # (name, sorted label items) -> value
+        self.histograms = {}  # stage -> [per-bucket counts..., +Inf count, sum]
+
+    @staticmethod
+    def key(name, **labels):
+        """Precomputed counter key for add() on hot paths"""
+        return (name, tuple(sorted(labels.items())))
+
+    def inc(self, name, amount=1, **labels):
+        self.add(self.key(name, **labels), amount)
+
+    def add(self, key, amount=1):
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def observe(self, stage, seconds):
+        profile = REQUEST_PROFILE.get()
+        with self.lock:
+            histogram = self.histograms.get(stage)
+            if histogram is None:
+                histogram = self.histograms[stage] = [0] * (len(self.buckets) + 1) + [0.0]
+            histogram[bisect.bisect_left(self.buckets, seconds)] += 1
+            histogram[-1] += seconds
+            if profile is not None:
+                profile[stage] = profile.get(stage, 0.0) + seconds
+
+    def time(self, stage):
+        return StageTimer(self, stage)
+
+    def render(self, gauges=()):
+        """Prometheus text exposition; `gauges` adds (name, labels, value) read at scrape time"""
+        with self.lock:
+            counters = sorted(self.counters.items())
+            histograms = sorted((stage, list(h)) for stage, h in self.histograms.items())
+
+        lines = ["# TYPE stage_duration_seconds histogram"]
+        for stage, histogram in histograms:
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), histogram):
+                cumulative += count
+                lines.append(f'stage_duration_seconds_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+            lines.append(f'stage_duration_seconds_sum{{stage="{stage}"}} {histogram[-1]:.6f}')
+            lines.append(f'stage_duration_seconds_count{{stage="{stage}"}} {cumulative}')
+
+        seen = set()
+        for (name, labels), value in list(counters) + [((n, tuple(sorted(l.items()))), v) for n, l, v in gauges]:
+            if name not in seen:
+                seen.add(name)
+                lines.append(f"# TYPE {name} {'counter' if name.endswith('_total') else 'gauge'}")
+            label_text = ",".join(f'{k}="{v}"' for k, v in labels)
+            lines.append(f"{name}{{{label_text}}} {value}" if label_text else f"{name} {value}")
+        return "\n".join(lines) + "\n"
+
+class StageTimer:
+    """`with METRICS.time(stage):` block timer (a class: cheaper than a generator)"""
+    __slots__ = ("metrics", "stage", "start")
+
+    def __init__(self, metrics, stage):
+        self.metrics = metrics
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.metrics.observe(self.stage, time.perf_counter() - self.start)
+        return False
+
+METRICS = Metrics(METRIC_BUCKETS)
+
+def submit_in_context(executor, fn, *args):
+    """executor.submit that keeps the caller's request profile for stage timings"""
+    return executor.submit(contextvars.copy_context().run, fn, *args)
+
+def timed(stage):
+    """Decorator recording every call of a function under `stage`"""
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                METRICS.observe(stage, time.perf_counter() - start)
+        return wrapper
+    return decorate
+
+@app.before_request
+def start_request_profile():
+    if request.headers.get('X-Profile') == '1':
+        g.profile_token = REQUEST_PROFILE.set({})
+        g.profile_start = time.perf_counter()
+
+@app.after_request
+def add_server_timing(response):
+    if 'profile_token' in g:
+        stages = dict(REQUEST_PROFILE.get() or {})
+        stages["total"] = time.perf_counter() - g.profile_start
+        response.headers['Server-Timing'] = ", ".join(
+            f"{stage};dur={seconds * 1000:.2f}" for stage, seconds in stages.items()
+        )
+    return response
+
+@app.teardown_request
+def end_request_profile(exc):
+    if 'profile_token' in g:
+        REQUEST_PROFILE.reset(g.pop('profile_token'))
+
+def json_response(payload):
+    """jsonify, timed as the json stage"""
+    with METRICS.time("json"):
+        return jsonify(payload)
+
+# ------------------ RESPONSE COMPRESSION ------------------
+# JSON and text responses above COMPRESS_MIN_BYTES are compressed with brotli
+# when the client accepts it and the optional `brotli` package is installed,
+# otherwise gzip. Streamed responses and static files are left alone.
+COMPRESS_MIN_BYTES = int(os.environ.get("COMPRESS_MIN_BYTES", 1024))
+COMPRESS_MIMETYPES = {"application/json", "text/plain"}
+try:
+    import brotli  # optional
+except ImportError:
+    brotli = None
+
+@app.after_request
+def compress_response(response):
+    if (response.direct_passthrough or response.is_streamed or response.status_code != 200
+            or response.mimetype not in COMPRESS_MIMETYPES or 'Content-Encoding' in response.headers):
+        return response
+    response.vary.add('Accept-Encoding')
+    body = response.get_data()
+    if len(body) < COMPRESS_MIN_BYTES:
+        return response
+
+    accepted = request.accept_encodings
+    with METRICS.time("compress"):
+        if brotli is not None and accepted['br']:
+            response.set_data(brotli.compress(body, quality=5))
+            response.headers['Content-Encoding'] = 'br'
+        elif accepted['gzip']:
+            response.set_data(gzip.compress(body, compresslevel=6, mtime=0))
+            response.headers['Content-Encoding'] = 'gzip'
+    return response
+
 # ------------------ LOAD MODEL ------------------
 # REFACTORED FOR VERCEL: Using Hugging Face Inference API instead of local model
 # This drastically reduces the bundle size (< 250MB) 
@@ -18,35 +225,773 @@ import requests
 
 # UPDATED: Old URL 'api-inference.huggingface.co' is deprecated.
 # New URL is 'router.huggingface.co/hf-inference'
-HF_API_URL = "https://router.huggingface.co/hf-inference/models/ProsusAI/finbert"
+HF_API_URL = os.environ.get("HF_API_URL", "https://router.huggingface.co/hf-inference/models/ProsusAI/finbert")
 # Get API token from environment variable (Best practice for Vercel)
 HF_API_TOKEN = os.environ.get("HF_API_TOKEN")
 
-if not HF_API_TOKEN:
+MAX_INPUT_CHARS = 512  # FinBERT truncation applied to every input
+HF_MAX_BATCH_SIZE = int(os.environ.get("HF_MAX_BATCH_SIZE", 32))  # Largest inputs list per API call
+
+# Which engine scores text: "api" (Hugging Face Inference API) or "onnx" (local CPU)
+SENTIMENT_BACKEND = os.environ.get("SENTIMENT_BACKEND", "api").lower()
+# Load the local model (and heavy imports) at import time, for gunicorn's
+# preload_app: workers forked from the master then share the weights copy-on-write
+PRELOAD_MODEL = os.environ.get("PRELOAD_MODEL", "false").lower() == "true"
+
+if SENTIMENT_BACKEND == "api" and not HF_API_TOKEN:
     print("WARNING: HF_API_TOKEN not found in environment variables. Sentiment analysis will fail.")
 
+# ------------------ HF HTTP CLIENT ------------------
+HF_CONNECT_TIMEOUT = float(os.environ.get("HF_CONNECT_TIMEOUT", 3.05))  # seconds
+HF_READ_TIMEOUT = float(os.environ.get("HF_READ_TIMEOUT", 20))  # seconds
+HF_MAX_RETRIES = int(os.environ.get("HF_MAX_RETRIES", 3))
+HF_BACKOFF_SECONDS = float(os.environ.get("HF_BACKOFF_SECONDS", 0.5))
+HF_POOL_SIZE = int(os.environ.get("HF_POOL_SIZE", 10))
+HF_RETRY_STATUSES = (429, 503)  # rate limited / model loading
+
+# ------------------ UPSTREAM GUARDS ------------------
+# Every Hugging Face and Yahoo call runs inside `with HF_LIMIT:` /
+# `with YAHOO_LIMIT:`, which applies, in order:
+#   - a circuit breaker: after CIRCUIT_FAILURE_THRESHOLD consecutive failures
+#     calls fail fast for CIRCUIT_RESET_SECONDS, then one half-open probe
+#     decides whether it closes again
+#   - a token bucket budget (calls/second), halved on each 429 and raised
+#     back gradually on success
+#   - a concurrency cap; with threaded workers one process holds many
+#     requests in flight and this keeps them from all hitting one upstream
+# Callers queue for a token or slot up to UPSTREAM_QUEUE_TIMEOUT seconds.
+HF_MAX_CONCURRENCY = int(os.environ.get("HF_MAX_CONCURRENCY", HF_POOL_SIZE))
+YAHOO_MAX_CONCURRENCY = int(os.environ.get("YAHOO_MAX_CONCURRENCY", 8))
+UPSTREAM_QUEUE_TIMEOUT = float(os.environ.get("UPSTREAM_QUEUE_TIMEOUT", 10))
+HF_RATE_PER_SECOND = float(os.environ.get("HF_RATE_PER_SECOND", 10))
+HF_RATE_BURST = int(os.environ.get("HF_RATE_BURST", 20))
+YAHOO_RATE_PER_SECOND = float(os.environ.get("YAHOO_RATE_PER_SECOND", 10))
+YAHOO_RATE_BURST = int(os.environ.get("YAHOO_RATE_BURST", 50))
+CIRCUIT_FAILURE_THRESHOLD = int(os.environ.get("CIRCUIT_FAILURE_THRESHOLD", 5))
+CIRCUIT_RESET_SECONDS = float(os.environ.get("CIRCUIT_RESET_SECONDS", 30))
+
+class UpstreamBusy(Exception):
+    """No call budget or concurrency slot for an upstream freed up in time"""
+
+class CircuitOpen(UpstreamBusy):
+    """The upstream's circuit breaker is open, so the call failed fast"""
+
+def guard_error_status(error):
+    """Metrics status label for errors raised by an UpstreamLimit itself"""
+    if isinstance(error, CircuitOpen):
+        return "circuit_open"
+    if isinstance(error, UpstreamBusy):
+        return "busy"
+    return None
+
+class TokenBucket:
+    """Call budget refilled at `rate` per second, adapted on rate limiting (AIMD)"""
+
+    def __init__(self, rate, burst):
+        self.max_rate = rate
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def take(self, timeout):
+        """Wait up to `timeout` seconds for a token; False if none came"""
+        deadline = time.monotonic() + timeout
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.refill(now)
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return True
+                wait_for = (1 - self.tokens) / self.rate
+            if now + wait_for > deadline:
+                return False
+            time.sleep(wait_for)
+
+    def throttle(self):
+        """Rate limited: halve the rate (down to 1/20 of the configured one)"""
+        with self.lock:
+            self.refill(time.monotonic())
+            self.rate = max(self.max_rate / 20, self.rate / 2)
+            self.tokens = min(self.tokens, 0.0)
+
+    def relax(self):
+        """Successful call: win back 1/20 of the configured rate"""
+        if self.rate < self.max_rate:
+            with self.lock:
+                self.refill(time.monotonic())
+                self.rate = min(self.max_rate, self.rate + self.max_rate / 20)
+
+class CircuitBreaker:
+    """closed -> open after `threshold` consecutive failures -> half-open probe"""
+
+    STATES = {"closed": 0, "half_open": 1, "open": 2}
+
+    def __init__(self, name, threshold, reset_seconds):
+        self.name = name
+        self.threshold = threshold
+        self.reset_seconds = reset_seconds
+        self.lock = threading.Lock()
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probing = False
+        self.opens = 0
+
+    def before_call(self):
+        """Raise CircuitOpen unless a call may go through now"""
+        if self.state == "closed":
+            return
+        with self.lock:
+            if self.state == "closed":
+                return
+            if self.state == "open":
+                if time.monotonic() - self.opened_at < self.reset_seconds:
+                    raise CircuitOpen(f"{self.name} circuit is open")
+                self.state = "half_open"
+            if self.probing:
+                raise CircuitOpen(f"{self.name} circuit is half-open, probe in flight")
+            self.probing = True
+
+    def cancel_probe(self):
+        with self.lock:
+            self.probing = False
+
+    def record(self, ok):
+        with self.lock:
+            self.probing = False
+            if ok:
+                self.failures = 0
+                if self.state != "closed":
+                    print(f"{self.name} recovered, closing circuit")
+                    self.state = "closed"
+                return
+            self.failures += 1
+            if self.state == "half_open" or (self.state == "closed" and self.failures >= self.threshold):
+                print(f"{self.name} failing, opening circuit for {self.reset_seconds:.0f}s")
+                self.state = "open"
+                self.opened_at = time.monotonic()
+                self.opens += 1
+
+def classify_upstream_error(error):
+    """"rate_limited", "failure" (upstream trouble) or "ok" (it answered, data was unusable)"""
+    status = getattr(getattr(error, 'response', None), 'status_code', None)
+    # yfinance raises YFRateLimitError; older versions only say so in the message
+    if status == 429 or type(error).__name__ == "YFRateLimitError" or "Too Many Requests" in str(error):
+        return "rate_limited"
+    if isinstance(error, (requests.RequestException, OSError)) or \
+            type(error).__module__.startswith(("curl_cffi", "urllib3")):
+        return "failure"
+    return "ok"
+
+class UpstreamLimit:
+    """Context manager guarding calls to one upstream (breaker, budget, concurrency)"""
+
+    def __init__(self, name, limit, rate, burst, timeout=UPSTREAM_QUEUE_TIMEOUT):
+        self.name = name
+        self.limit = limit
+        self.timeout = timeout
+        self.slots = threading.BoundedSemaphore(limit)
+        self.bucket = TokenBucket(rate, burst)
+        self.breaker = CircuitBreaker(name, CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_RESET_SECONDS)
+        self.lock = threading.Lock()
+        self.local = threading.local()  # outcome of this thread's current call
+        self.in_flight = 0
+        self.rejected = 0
+
+    def __enter__(self):
+        self.breaker.before_call()
+        try:
+            if not self.bucket.take(self.timeout):
+                self.reject()
+                raise UpstreamBusy(f"{self.name} call budget exhausted")
+            if not self.slots.acquire(timeout=self.timeout):
+                self.reject()
+                raise UpstreamBusy(f"{self.name} is at its concurrency limit ({self.limit})")
+        except UpstreamBusy:
+            self.breaker.cancel_probe()
+            raise
+        with self.lock:
+            self.in_flight += 1
+        self.local.outcome = None
+        return self
+
+    def reject(self):
+        with self.lock:
+            self.rejected += 1
+
+    def mark(self, outcome):
+        """Report the outcome of a call that didn't raise (e.g. an HTTP 429/5xx response)"""
+        self.local.outcome = outcome
+
+    def __exit__(self, exc_type, exc, tb):
+        with self.lock:
+            self.in_flight -= 1
+        self.slots.release()
+
+        outcome = self.local.outcome or (classify_upstream_error(exc) if exc else "ok")
+        if outcome == "rate_limited":
+            # The upstream is up but wants fewer calls: that's the bucket's job,
+            # and counting each retried 429 would trip the breaker for everyone
+            self.bucket.throttle()
+        if outcome in ("loading", "rate_limited"):
+            # Neither a failure nor a success (e.g. HF "model is loading")
+            self.breaker.cancel_probe()
+            return False
+        if outcome == "ok":
+            self.bucket.relax()
+        self.breaker.record(outcome == "ok")
+        return False
+
+    def is_open(self):
+        return self.breaker.state == "open"
+
+    def stats(self):
+        with self.lock:
+            return {
+                "limit": self.limit,
+                "in_flight": self.in_flight,
+                "rejected": self.rejected,
+                "rate_per_second": round(self.bucket.rate, 3),
+                "circuit": self.breaker.state,
+                "circuit_opens": self.breaker.opens,
+            }
+
+HF_LIMIT = UpstreamLimit("Hugging Face", HF_MAX_CONCURRENCY, HF_RATE_PER_SECOND, HF_RATE_BURST)
+YAHOO_LIMIT = UpstreamLimit("Yahoo Finance", YAHOO_MAX_CONCURRENCY, YAHOO_RATE_PER_SECOND, YAHOO_RATE_BURST)
+
+def estimated_load_time(response):
+    """Seconds until the model is ready, for a 503 "model is loading" response, else None"""
+    if response.status_code != 503:
+        return None
+    try:
+        return float(response.json()["estimated_time"])
+    except Exception:
+        return None
+
+class HFClient:
+    """Shared keep-alive session for the inference API with timeouts and retries"""
+
+    def __init__(self, url, token):
+        self.url = url
+        self.token = token
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=HF_POOL_SIZE)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.lock = threading.Lock()
+        self.latencies = deque(maxlen=1000)  # seconds, most recent calls
+        self.calls = 0
+        self.retries = 0
+
+    def retry_delay(self, response, attempt):
+        """Seconds to wait before retrying, honouring the server's hints"""
+        delay = HF_BACKOFF_SECONDS * (2 ** attempt)
+        retry_after = response.headers.get('Retry-After')
+        if retry_after and retry_after.isdigit():
+            delay = max(delay, int(retry_after))
+        elif estimated_load_time(response) is not None:
+            delay = max(delay, estimated_load_time(response))
+        return min(delay, HF_READ_TIMEOUT)
+
+    def post(self, payload):
+        """POST a payload, retrying 429/503 with backoff"""
+        with METRICS.time("hf_api"):
+            return self.post_with_retries(payload)
+
+    def post_with_retries(self, payload):
+        headers = {"Authorization": f"Bearer {self.token}"}
+        start = time.perf_counter()
+        attempt = 0
+        while True:
+            with HF_LIMIT:
+                response = self.session.post(
+                    self.url, headers=headers, json=payload,
+                    timeout=(HF_CONNECT_TIMEOUT, HF_READ_TIMEOUT)
+                )
+                if response.status_code == 429:
+                    HF_LIMIT.mark("rate_limited")
+                elif estimated_load_time(response) is not None:
+                    HF_LIMIT.mark("loading")  # a cold model, to be waited out
+                elif response.status_code >= 500:
+                    HF_LIMIT.mark("failure")
+            if response.status_code != 200:
+                METRICS.inc("upstream_errors_total", upstream="huggingface", status=str(response.status_code))
+            if response.status_code not in HF_RETRY_STATUSES or attempt >= HF_MAX_RETRIES:
+                break
+            delay = self.retry_delay(response, attempt)
+            with self.lock:
+                self.retries += 1
+            print(f"HF API returned {response.status_code}, retrying in {delay:.1f}s")
+            time.sleep(delay)
+            attempt += 1
+
+        latency = time.perf_counter() - start
+        with self.lock:
+            self.calls += 1
+            self.latencies.append(latency)
+        return response
+
+    def stats(self):
+        with self.lock:
+            latencies = sorted(self.latencies)
+            last = self.latencies[-1] if self.latencies else None
+            calls, retries = self.calls, self.retries
+        if not latencies:
+            return {"calls": calls, "retries": retries}
+        return {
+            "calls": calls,
+            "retries": retries,
+            "latency_avg_ms": round(sum(latencies) / len(latencies) * 1000, 1),
+            "latency_p50_ms": round(latencies[len(latencies) // 2] * 1000, 1),
+            "latency_p95_ms": round(latencies[int(len(latencies) * 0.95)] * 1000, 1),
+            "latency_last_ms": round(last * 1000, 1),
+        }
+
+HF_CLIENT = HFClient(HF_API_URL, HF_API_TOKEN)
+
 def query_hf_api(payload):
     """Send text to Hugging Face API for analysis"""
-    headers = {"Authorization": f"Bearer {HF_API_TOKEN}"}
     try:
-        response = requests.post(HF_API_URL, headers=headers, json=payload)
+        response = HF_CLIENT.post(payload)
         
         # Check for non-200 status codes
         if response.status_code != 200:
             # Try to get JSON error if possible
             try:
                 error_json = response.json()
-                return {"error": f"API Error {response.status_code}: {error_json.get('error', str(error_json))}"}
+                return {"error": f"API Error {response.status_code}: {error_json.get('error', str(error_json))}",
+                        "status": response.status_code}
             except:
                 # Fallback to raw text (handling HTML responses etc)
-                return {"error": f"API Error {response.status_code}: {response.text[:200]}"}
+                return {"error": f"API Error {response.status_code}: {response.text[:200]}",
+                        "status": response.status_code}
 
         return response.json()
     except Exception as e:
         print(f"API Error: {e}")
+        METRICS.inc("upstream_errors_total", upstream="huggingface", status=guard_error_status(e) or "exception")
         return {"error": str(e)}
 
-print("App initialized in Lightweight Mode (API)")
+# ------------------ LOCAL ONNX ENGINE ------------------
+# Int8-quantized ONNX export of FinBERT run on CPU with onnxruntime.
+# The directory must hold model.onnx, tokenizer.json and config.json.
+ONNX_MODEL_DIR = os.environ.get("ONNX_MODEL_DIR", "models/finbert-onnx-int8")
+ONNX_BATCH_SIZE = int(os.environ.get("ONNX_BATCH_SIZE", 16))
+# 0 = onnxruntime default. A preloaded session is shared by forked workers and
+# onnxruntime's thread pool doesn't survive fork(), so it defaults to one thread
+# there and scales with WEB_CONCURRENCY instead.
+ONNX_THREADS = int(os.environ.get("ONNX_THREADS", 1 if PRELOAD_MODEL else 0))
+ONNX_MAX_TOKENS = 512
+
+class OnnxSentimentEngine:
+    """Local FinBERT inference returning the same shape as the inference API"""
+
+    def __init__(self, model_dir):
+        # Optional dependencies, only needed for this backend
+        import numpy as np
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        self.np = np
+        options = ort.SessionOptions()
+        if ONNX_THREADS:
+            options.intra_op_num_threads = ONNX_THREADS
+        self.session = ort.InferenceSession(
+            os.path.join(model_dir, "model.onnx"), options, providers=["CPUExecutionProvider"]
+        )
+        self.input_names = {i.name for i in self.session.get_inputs()}
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=ONNX_MAX_TOKENS)
+        self.tokenizer.enable_padding()  # pads to the longest sequence in each batch
+
+        with open(os.path.join(model_dir, "config.json")) as f:
+            id2label = json.load(f)["id2label"]
+        self.labels = [id2label[str(i)].lower() for i in range(len(id2label))]
+
+    def predict(self, texts):
+        """Score texts, returns [[{label, score}, ...], ...] sorted by score"""
+        # Sort by length so each batch pads to similar-sized sequences
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        outputs = [None] * len(texts)
+
+        for start in range(0, len(order), ONNX_BATCH_SIZE):
+            batch = order[start:start + ONNX_BATCH_SIZE]
+            encodings = self.tokenizer.encode_batch([texts[i] for i in batch])
+            feed = {
+                "input_ids": self.np.array([e.ids for e in encodings], dtype=self.np.int64),
+                "attention_mask": self.np.array([e.attention_mask for e in encodings], dtype=self.np.int64),
+            }
+            if "token_type_ids" in self.input_names:
+                feed["token_type_ids"] = self.np.array([e.type_ids for e in encodings], dtype=self.np.int64)
+
+            logits = self.session.run(None, feed)[0]
+            logits = logits - logits.max(axis=1, keepdims=True)
+            probs = self.np.exp(logits)
+            probs /= probs.sum(axis=1, keepdims=True)
+
+            for i, row in zip(batch, probs):
+                scores = [{"label": label, "score": float(p)} for label, p in zip(self.labels, row)]
+                outputs[i] = sorted(scores, key=lambda x: x["score"], reverse=True)
+
+        return outputs
+
+ONNX_ENGINE = None
+ONNX_ENGINE_LOCK = threading.Lock()
+
+def get_onnx_engine():
+    """Load the ONNX engine on first use"""
+    global ONNX_ENGINE
+    if ONNX_ENGINE is None:
+        with ONNX_ENGINE_LOCK:
+            if ONNX_ENGINE is None:
+                print(f"Loading ONNX FinBERT from {ONNX_MODEL_DIR}...")
+                ONNX_ENGINE = OnnxSentimentEngine(ONNX_MODEL_DIR)
+    return ONNX_ENGINE
+
+def run_model_direct(inputs):
+    """Score a list of inputs on the configured backend"""
+    if SENTIMENT_BACKEND == "onnx":
+        try:
+            return get_onnx_engine().predict(inputs)
+        except Exception as e:
+            print(f"ONNX Error: {e}")
+            return {"error": f"Local model error: {e}"}
+    # top_k keeps all three class probabilities in the same call
+    parameters = {"top_k": 3}
+    if len(inputs) == 1 and not HF_BATCH_INPUTS:
+        return query_hf_api({"inputs": inputs[0], "parameters": parameters})
+    return query_hf_api({"inputs": inputs, "parameters": parameters})
+
+# ------------------ MICRO-BATCHING SCHEDULER ------------------
+MICROBATCH_ENABLED = os.environ.get("MICROBATCH", "true").lower() != "false"
+MICROBATCH_MAX_WAIT_MS = float(os.environ.get("MICROBATCH_MAX_WAIT_MS", 5))
+# Batches in flight at once: the remote API is I/O bound, a local model is not
+MICROBATCH_CONCURRENCY = int(os.environ.get("MICROBATCH_CONCURRENCY", 1 if SENTIMENT_BACKEND == "onnx" else 4))
+
+class MicroBatcher:
+    """Coalesce model calls from concurrent requests into shared batches.
+
+    Callers block in submit() while a worker thread gathers queued jobs
+    until `max_batch_size` inputs are waiting or `max_wait` seconds have
+    passed since the first one, then runs them through `batch_fn` as one
+    call. `batch_fn` takes a list of inputs and returns a list aligned
+    with it, or an {"error": ...} dict that is handed to every caller.
+    """
+
+    def __init__(self, batch_fn, max_batch_size, max_wait, concurrency=1):
+        self.batch_fn = batch_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.concurrency = concurrency
+        self.lock = threading.Lock()
+        self.pid = None
+        self.batches = 0
+        self.inputs = 0
+
+    def ensure_worker(self):
+        # Started lazily (and again after a fork) since threads don't survive fork()
+        if self.pid == os.getpid():
+            return
+        with self.lock:
+            if self.pid != os.getpid():
+                self.queue = queue.Queue()
+                self.executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="microbatch")
+                threading.Thread(target=self.run, daemon=True, name="microbatch-scheduler").start()
+                self.pid = os.getpid()
+
+    def submit(self, inputs):
+        self.ensure_worker()
+        job = {"inputs": inputs, "done": threading.Event(), "result": None}
+        self.queue.put(job)
+        job["done"].wait()
+        return job["result"]
+
+    def run(self):
+        carry = None
+        while True:
+            jobs = [carry or self.queue.get()]
+            carry = None
+            size = len(jobs[0]["inputs"])
+            deadline = time.monotonic() + self.max_wait
+            while size < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    job = self.queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if size + len(job["inputs"]) > self.max_batch_size:
+                    carry = job  # Would overflow the batch: it starts the next one
+                    break
+                jobs.append(job)
+                size += len(job["inputs"])
+            self.executor.submit(self.flush, jobs)
+
+    def flush(self, jobs):
+        inputs = [text for job in jobs for text in job["inputs"]]
+        try:
+            outputs = self.batch_fn(inputs)
+        except Exception as e:
+            outputs = {"error": str(e)}
+
+        with self.lock:
+            self.batches += 1
+            self.inputs += len(inputs)
+
+        offset = 0
+        for job in jobs:
+            count = len(job["inputs"])
+            if isinstance(outputs, dict):
+                job["result"] = outputs
+            else:
+                job["result"] = outputs[offset:offset + count]
+            offset += count
+            job["done"].set()
+
+    def stats(self):
+        with self.lock:
+            return {
+                "batches": self.batches,
+                "inputs": self.inputs,
+                "avg_batch_size": round(self.inputs / self.batches, 2) if self.batches else 0.0,
+            }
+
+def run_model_aligned(inputs):
+    """Backend call normalised to one result per input (for merged batches)"""
+    output = run_model_direct(inputs)
+    if isinstance(output, dict) and 'error' in output:
+        return output
+    return split_batch_output(output, len(inputs))
+
+MODEL_BATCHER = MicroBatcher(
+    run_model_aligned, HF_MAX_BATCH_SIZE, MICROBATCH_MAX_WAIT_MS / 1000, MICROBATCH_CONCURRENCY
+)
+
+def run_model(inputs):
+    """Score a list of inputs, sharing model batches with concurrent requests"""
+    # Merging callers needs list inputs, which HF_BATCH_INPUTS=false rules out for the API
+    if MICROBATCH_ENABLED and (HF_BATCH_INPUTS or SENTIMENT_BACKEND == "onnx"):
+        return MODEL_BATCHER.submit(inputs)
+    return run_model_direct(inputs)
+
+def backend_config_error():
+    """Return a configuration error message for the active backend, if any"""
+    if SENTIMENT_BACKEND == "api" and not HF_API_TOKEN:
+        return "Configuration Error: HF_API_TOKEN is missing on server."
+    if SENTIMENT_BACKEND not in ("api", "onnx"):
+        return f"Configuration Error: unknown SENTIMENT_BACKEND '{SENTIMENT_BACKEND}'."
+    return None
+
+# Identifies the model in cache keys so backends never share entries
+SENTIMENT_MODEL_ID = f"onnx:{ONNX_MODEL_DIR}" if SENTIMENT_BACKEND == "onnx" else HF_API_URL
+
+# ------------------ BATCHED INFERENCE ------------------
+
+def parse_sentiment_result(item):
+    """Turn one API result (nested or flat) into {label, score, scores}
+
+    `scores` holds the probability of every class the model returned;
+    classes missing from the output stay at 0.0.
+    """
+    if isinstance(item, dict) and 'scores' in item:
+        return item  # Already parsed (e.g. by the micro-batcher)
+
+    candidates = item if isinstance(item, list) else [item]
+    candidates = [c for c in candidates if isinstance(c, dict) and 'label' in c and 'score' in c]
+    if not candidates:
+        return None
+
+    best = max(candidates, key=lambda c: c['score'])
+    scores = {"positive": 0.0, "neutral": 0.0, "negative": 0.0}
+    for c in candidates:
+        scores[c['label'].lower()] = c['score']
+    return {"label": best['label'], "score": best['score'], "scores": scores}
+
+def expected_sentiment(scores):
+    """Probability-weighted sentiment in [-1, 1] (p_positive - p_negative)"""
+    return scores.get('positive', 0.0) - scores.get('negative', 0.0)
+
+def split_batch_output(api_output, count):
+    """Map a raw API response back onto `count` inputs"""
+    if not isinstance(api_output, list) or len(api_output) == 0:
+        return [None] * count
+
+    # Nested [[{...}, ...], ...] -> one inner list per input
+    # Flat [{...}, ...] -> one dict per input (or all labels of a single input)
+    if len(api_output) != count and count == 1:
+        return [parse_sentiment_result(api_output)]
+
+    results = [parse_sentiment_result(item) for item in api_output[:count]]
+    return results + [None] * (count - len(results))
+
+# ------------------ SENTIMENT CACHE ------------------
+SENTIMENT_CACHE_SIZE = int(os.environ.get("SENTIMENT_CACHE_SIZE", 10000))
+SENTIMENT_CACHE_TTL = int(os.environ.get("SENTIMENT_CACHE_TTL", 3600))  # seconds
+
+class SentimentCache:
+    """Bounded LRU + TTL cache of model results, keyed on a content hash"""
+
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.entries = OrderedDict()  # key -> (timestamp, result)
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def make_key(text):
+        # Hash exactly what the model sees: truncated, whitespace-normalised
+        normalised = " ".join(text[:MAX_INPUT_CHARS].split())
+        raw = f"{SENTIMENT_MODEL_ID}\n{MAX_INPUT_CHARS}\n{normalised}"
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and time.time() - entry[0] < self.ttl:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                del self.entries[key]
+            self.misses += 1
+            return None
+
+    def set(self, key, result):
+        if self.max_size <= 0:
+            return
+        with self.lock:
+            self.entries[key] = (time.time(), result)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self):
+        with self.lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self.entries),
+                "max_size": self.max_size,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            }
+
+SENTIMENT_CACHE = SentimentCache(SENTIMENT_CACHE_SIZE, SENTIMENT_CACHE_TTL)
+
+def query_sentiment_batch(texts):
+    """Score several texts in a single API round-trip.
+
+    Returns a list aligned with `texts` where each entry is a {label, score}
+    dict or None, or an {"error": ...} dict if the call itself failed.
+    """
+    if not texts:
+        return []
+
+    # Serve what we can from the cache, send each distinct miss once
+    with METRICS.time("sentiment_cache"):
+        keys = [SENTIMENT_CACHE.make_key(t) for t in texts]
+        results = [SENTIMENT_CACHE.get(k) for k in keys]
+    pending = {}
+    for text, key, result in zip(texts, keys, results):
+        if result is None and key not in pending:
+            pending[key] = text[:MAX_INPUT_CHARS]
+
+    if pending:
+        inputs = list(pending.values())
+        with METRICS.time("model"):
+            api_output = run_model(inputs)
+
+        if isinstance(api_output, dict) and 'error' in api_output:
+            return api_output
+
+        fresh = dict(zip(pending.keys(), split_batch_output(api_output, len(inputs))))
+        for key, result in fresh.items():
+            if result is not None:
+                SENTIMENT_CACHE.set(key, result)
+        results = [r if r is not None else fresh.get(k) for r, k in zip(results, keys)]
+
+    return results
+
+# Chunks of one bulk call run in parallel, HF_LIMIT still caps the upstream calls
+CHUNK_EXECUTOR = ThreadPoolExecutor(max_workers=HF_MAX_CONCURRENCY, thread_name_prefix="hf-chunks")
+
+def query_sentiment_chunked(texts):
+    """Score any number of texts, HF_MAX_BATCH_SIZE inputs per API call.
+
+    Unlike query_sentiment_batch, a failed chunk does not fail the whole
+    call: its entries are replaced by the {"error": ...} dict.
+    """
+    size = HF_MAX_BATCH_SIZE if HF_BATCH_INPUTS else 1
+    chunks = [texts[start:start + size] for start in range(0, len(texts), size)]
+    if len(chunks) == 1:
+        outputs = [query_sentiment_batch(chunks[0])]
+    else:
+        futures = [submit_in_context(CHUNK_EXECUTOR, query_sentiment_batch, chunk) for chunk in chunks]
+        outputs = []
+        for future in futures:
+            try:
+                outputs.append(future.result())
+            except Exception as e:
+                outputs.append({"error": str(e)})
+
+    results = []
+    for chunk, chunk_results in zip(chunks, outputs):
+        if isinstance(chunk_results, dict):
+            chunk_results = [chunk_results] * len(chunk)
+        results.extend(chunk_results)
+    return results
+
+# ------------------ CONCURRENT FAN-OUT ------------------
+# For backends that reject list inputs: one call per text, run in parallel
+HF_BATCH_INPUTS = os.environ.get("HF_BATCH_INPUTS", "true").lower() != "false"
+TREND_DEADLINE_SECONDS = float(os.environ.get("TREND_DEADLINE_SECONDS", 5))
+FANOUT_WORKERS = int(os.environ.get("FANOUT_WORKERS", 8))
+
+FANOUT_EXECUTOR = ThreadPoolExecutor(max_workers=FANOUT_WORKERS, thread_name_prefix="hf-fanout")
+
+def submit_sentiment_fanout(texts):
+    """Start scoring each text in its own API call, returns (deadline, futures)"""
+    deadline = time.monotonic() + TREND_DEADLINE_SECONDS
+    return deadline, [submit_in_context(FANOUT_EXECUTOR, query_sentiment_batch, [t]) for t in texts]
+
+@timed("trend_wait")
+def collect_sentiment_fanout(pending):
+    """Gather fan-out results; anything late or failed comes back as None"""
+    deadline, futures = pending
+    wait(futures, timeout=max(0, deadline - time.monotonic()))
+
+    results = []
+    for future in futures:
+        if not future.done():
+            # Dropped: the call keeps running and still fills the cache
+            results.append(None)
+            continue
+        try:
+            output = future.result()
+        except Exception:
+            output = None
+        results.append(output[0] if isinstance(output, list) and output else None)
+    return results
+
+if SENTIMENT_BACKEND == "onnx":
+    print("App initialized in Local Mode (ONNX)")
+else:
+    print("App initialized in Lightweight Mode (API)")
 
 # ------------------ COMPANY TO TICKER MAPPING ------------------
 COMPANY_TICKERS = {
@@ -90,23 +1035,239 @@ BEARISH_KEYWORDS = [
     'recession', 'inflation', 'warning', 'bankruptcy', 'cut', 'slump', 'concern'
 ]
 
+# ------------------ IMPACT LEXICON ------------------
+# Keywords are compiled into one hashed {term: (side, weight)} table and the
+# text is tokenized once, so scoring cost doesn't grow with the lexicon.
+# IMPACT_LEXICON_PATH may point at a JSON file {"bullish": {"term": weight},
+# "bearish": {...}} that replaces the built-in lists; it is reloaded when
+# the file changes.
+IMPACT_LEXICON_PATH = os.environ.get("IMPACT_LEXICON_PATH")
+LEXICON_CHECK_SECONDS = 5
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+# (suffix, replacement) pairs mapping inflections back to lexicon terms
+INFLECTIONS = (("ies", "y"), ("es", ""), ("s", ""), ("ed", ""), ("ed", "e"),
+               ("d", ""), ("ing", ""), ("ing", "e"))
+
+def tokenize(text_lower):
+    return TOKEN_PATTERN.findall(text_lower)
+
+def token_forms(token):
+    """The token plus its likely base forms ("cuts" -> "cut", "rising" -> "rise")"""
+    forms = {token}
+    for suffix, replacement in INFLECTIONS:
+        stem = token[:-len(suffix)]
+        if token.endswith(suffix) and len(stem) >= 3:
+            forms.add(stem + replacement)
+            if suffix in ("ed", "ing") and stem[-1] == stem[-2]:
+                forms.add(stem[:-1])  # "dropped" -> "drop"
+    return forms
+
+def compile_lexicon(bullish, bearish):
+    """{"bullish": {term: weight}, ...} -> ({normalised term: (side, weight)}, longest n-gram)"""
+    terms = {}
+    for side, weights in (("bullish", bullish), ("bearish", bearish)):
+        for term, weight in weights.items():
+            key = " ".join(tokenize(term.lower()))
+            if key:
+                terms[key] = (side, float(weight))
+    longest = max((key.count(" ") + 1 for key in terms), default=1)
+    return terms, longest
+
+IMPACT_LEXICON = compile_lexicon(
+    {kw: 1 for kw in BULLISH_KEYWORDS}, {kw: 1 for kw in BEARISH_KEYWORDS}
+)
+LEXICON_STATE = {"mtime": None, "checked_at": 0.0}
+LEXICON_LOCK = threading.Lock()
+
+def get_impact_lexicon():
+    """Current compiled lexicon, reloading IMPACT_LEXICON_PATH if it changed"""
+    global IMPACT_LEXICON
+    if not IMPACT_LEXICON_PATH or time.time() - LEXICON_STATE["checked_at"] < LEXICON_CHECK_SECONDS:
+        return IMPACT_LEXICON
+
+    with LEXICON_LOCK:
+        LEXICON_STATE["checked_at"] = time.time()
+        try:
+            mtime = os.path.getmtime(IMPACT_LEXICON_PATH)
+            if mtime != LEXICON_STATE["mtime"]:
+                with open(IMPACT_LEXICON_PATH, encoding='utf-8') as f:
+                    data = json.load(f)
+                IMPACT_LEXICON = compile_lexicon(data.get("bullish", {}), data.get("bearish", {}))
+                LEXICON_STATE["mtime"] = mtime
+                print(f"Loaded impact lexicon with {len(IMPACT_LEXICON[0])} terms")
+        except (OSError, ValueError, AttributeError) as e:
+            print(f"WARNING: could not load impact lexicon from {IMPACT_LEXICON_PATH}: {e}")
+    return IMPACT_LEXICON
+
+def score_keywords(text_lower):
+    """Match lexicon terms in one pass over the tokens.
+
+    Returns {"bullish": (distinct terms, total weight), "bearish": (...)};
+    like the old substring test, each term counts once however often it
+    appears.
+    """
+    terms, longest = get_impact_lexicon()
+    tokens = tokenize(text_lower)
+    matched = set()
+
+    for i, token in enumerate(tokens):
+        for form in token_forms(token):
+            if form in terms:
+                matched.add(form)
+        for n in range(2, longest + 1):
+            if i + n > len(tokens):
+                break
+            gram = " ".join(tokens[i:i + n])
+            if gram in terms:
+                matched.add(gram)
+
+    totals = {"bullish": [0, 0.0], "bearish": [0, 0.0]}
+    for term in matched:
+        side, weight = terms[term]
+        totals[side][0] += 1
+        totals[side][1] += weight
+    return {side: tuple(values) for side, values in totals.items()}
+
+# ------------------ TICKER MATCHER ------------------
+# Symbols matched case-sensitively as written (e.g. "KO", not "ko")
+EXPLICIT_TICKERS = ['AAPL', 'MSFT', 'GOOGL', 'AMZN', 'META', 'TSLA', 'NVDA',
+                    'NFLX', 'JPM', 'BAC', 'WMT', 'DIS', 'KO', 'PEP', 'NKE']
+# Optional CSV of extra "alias,ticker" rows (e.g. full exchange listings).
+# All-uppercase aliases are symbols: always matched as a cashtag ("$A"), and
+# bare only when long enough and not an everyday word ("A", "IT", "ON").
+# Only cashtags and the curated list above win over company names.
+TICKER_ALIASES_PATH = os.environ.get("TICKER_ALIASES_PATH")
+TICKER_MIN_BARE_LENGTH = int(os.environ.get("TICKER_MIN_BARE_LENGTH", 3))
+TICKER_STOPWORDS = {
+    'A', 'I', 'AN', 'AM', 'ARE', 'AS', 'AT', 'BE', 'BY', 'DO', 'GO', 'HE', 'IF', 'IN', 'IS',
+    'IT', 'ME', 'MY', 'NO', 'OF', 'ON', 'OR', 'SO', 'TO', 'UP', 'US', 'WE', 'ALL', 'AND',
+    'ANY', 'BIG', 'CAN', 'FOR', 'HAS', 'NEW', 'NOW', 'ONE', 'OUT', 'SEE', 'THE', 'TWO',
+    'WAS', 'WAY', 'WHO', 'YOU', 'BEST', 'CASH', 'GOOD', 'LIFE', 'LOVE', 'MAIN', 'OPEN',
+    'PLAY', 'REAL', 'SAFE', 'TRUE', 'VERY', 'CEO', 'CFO', 'COO', 'CTO', 'EPS', 'ETF',
+    'FDA', 'FED', 'GDP', 'IPO', 'SEC', 'USA', 'EU', 'UK', 'AI', 'EV', 'PM', 'TV', 'NYSE',
+}
+
+class AhoCorasick:
+    """Multi-pattern matcher: finds every pattern occurrence in one pass"""
+
+    def __init__(self, patterns):
+        # patterns: {pattern string: value}
+        self.goto = [{}]
+        self.fail = [0]
+        self.out = [[]]
+        for pattern, value in patterns.items():
+            node = 0
+            for ch in pattern:
+                nxt = self.goto[node].get(ch)
+                if nxt is None:
+                    nxt = len(self.goto)
+                    self.goto[node][ch] = nxt
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.out.append([])
+                node = nxt
+            self.out[node].append((len(pattern), pattern, value))
+
+        # Breadth-first failure links; outputs inherit their fallback's outputs
+        pending = deque(self.goto[0].values())
+        while pending:
+            node = pending.popleft()
+            for ch, nxt in self.goto[node].items():
+                pending.append(nxt)
+                f = self.fail[node]
+                while f and ch not in self.goto[f]:
+                    f = self.fail[f]
+                fallback = self.goto[f].get(ch, 0)
+                self.fail[nxt] = fallback if fallback != nxt else 0
+                self.out[nxt] = self.out[nxt] + self.out[self.fail[nxt]]
+
+    def find_all(self, text):
+        """Yield (start, end, pattern, value) for every occurrence"""
+        goto, fail, out = self.goto, self.fail, self.out
+        node = 0
+        for i, ch in enumerate(text):
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            for length, pattern, value in out[node]:
+                yield i + 1 - length, i + 1, pattern, value
+
+def fold_case(text):
+    """text.lower() with one character per input character, so offsets into it
+    are offsets into `text` ("İ".lower() is two characters)"""
+    lowered = text.lower()
+    if len(lowered) == len(text):
+        return lowered
+    return "".join(ch.lower()[0] for ch in text)
+
+def is_word_boundary(text, start, end):
+    return (start == 0 or not text[start - 1].isalnum()) and \
+           (end == len(text) or not text[end].isalnum())
+
+def load_ticker_aliases():
+    """Built-in aliases plus any from TICKER_ALIASES_PATH: (case-insensitive,
+    symbols), where symbols maps a pattern to (ticker, beats company names)"""
+    aliases = dict(COMPANY_TICKERS)
+    symbols = {}
+    for t in EXPLICIT_TICKERS:
+        symbols[t] = symbols['$' + t] = (t, True)
+    if TICKER_ALIASES_PATH:
+        try:
+            with open(TICKER_ALIASES_PATH, encoding='utf-8') as f:
+                for row in csv.reader(f):
+                    if len(row) < 2 or not row[0].strip() or row[0].startswith('#'):
+                        continue
+                    alias, ticker = row[0].strip(), row[1].strip().upper()
+                    if alias.isupper():
+                        symbols.setdefault('$' + alias, (ticker, True))
+                        if len(alias) >= TICKER_MIN_BARE_LENGTH and alias not in TICKER_STOPWORDS:
+                            symbols.setdefault(alias, (ticker, False))
+                    else:
+                        aliases[alias.lower()] = ticker
+        except OSError as e:
+            print(f"WARNING: could not load ticker aliases from {TICKER_ALIASES_PATH}: {e}")
+    return aliases, symbols
+
+def build_ticker_matchers():
+    aliases, symbols = load_ticker_aliases()
+    print(f"Ticker matcher built with {len(aliases)} aliases and {len(symbols)} symbol patterns")
+    return AhoCorasick(aliases), AhoCorasick(symbols)
+
+ALIAS_MATCHER, SYMBOL_MATCHER = build_ticker_matchers()
+
+def extract_tickers(text):
+    """Every ticker mentioned in text, as [{ticker, match, start, end, explicit}]
+
+    Matches respect word boundaries; overlapping matches resolve to the
+    leftmost-longest one ("goldman sachs" wins over "goldman"). `explicit`
+    marks cashtags and curated symbols, which outrank company names.
+    """
+    candidates = [(start, end, ticker, explicit)
+                  for start, end, _, (ticker, explicit) in SYMBOL_MATCHER.find_all(text)]
+    candidates += [(start, end, value, False) for start, end, _, value in ALIAS_MATCHER.find_all(fold_case(text))]
+    candidates = [c for c in candidates if is_word_boundary(text, c[0], c[1])]
+    candidates.sort(key=lambda c: (c[0], c[0] - c[1]))
+
+    mentions = []
+    last_end = 0
+    for start, end, ticker, explicit in candidates:
+        if start < last_end:
+            continue
+        mentions.append({"ticker": ticker, "match": text[start:end], "start": start, "end": end, "explicit": explicit})
+        last_end = end
+    return mentions
+
+@timed("ticker")
 def extract_ticker(text):
     """Extract stock ticker from text"""
-    text_lower = text.lower()
-    
-    ticker_pattern = r'\b([A-Z]{1,5})\b'
-    explicit_tickers = re.findall(ticker_pattern, text)
+    mentions = extract_tickers(text)
     
-    for ticker in explicit_tickers:
-        if ticker in ['AAPL', 'MSFT', 'GOOGL', 'AMZN', 'META', 'TSLA', 'NVDA', 
-                      'NFLX', 'JPM', 'BAC', 'WMT', 'DIS', 'KO', 'PEP', 'NKE']:
-            return ticker
+    # Explicit symbols ("NVDA", "$A") take priority over company names
+    for mention in mentions:
+        if mention["explicit"]:
+            return mention["ticker"]
     
-    for company, ticker in COMPANY_TICKERS.items():
-        if company in text_lower:
-            return ticker
-    
-    return None
+    return mentions[0]["ticker"] if mentions else None
 
 def get_confidence_level(confidence):
     """Convert confidence % to human-readable level"""
@@ -119,12 +1280,15 @@ def get_confidence_level(confidence):
     else:
         return {"level": "Low", "color": "#ff5252"}
 
-def calculate_impact_score(text, sentiment, confidence):
+def calculate_impact_score(text, sentiment, confidence, scores=None):
     """Calculate Market Impact Score (-100 to +100)"""
     text_lower = text.lower()
     
-    # Base score from sentiment
-    if sentiment == 'positive':
+    # Base score from sentiment: expected value over all classes when the
+    # full distribution is known, otherwise the winning label's confidence
+    if scores:
+        base_score = expected_sentiment(scores) * 100
+    elif sentiment == 'positive':
         base_score = confidence
     elif sentiment == 'negative':
         base_score = -confidence
@@ -132,9 +1296,10 @@ def calculate_impact_score(text, sentiment, confidence):
         base_score = 0
     
     # Keyword multiplier
-    bullish_count = sum(1 for kw in BULLISH_KEYWORDS if kw in text_lower)
-    bearish_count = sum(1 for kw in BEARISH_KEYWORDS if kw in text_lower)
-    keyword_boost = (bullish_count - bearish_count) * 5
+    keywords = score_keywords(text_lower)
+    bullish_count, bullish_weight = keywords["bullish"]
+    bearish_count, bearish_weight = keywords["bearish"]
+    keyword_boost = (bullish_weight - bearish_weight) * 5
     
     # Text length factor (longer = more impactful, up to 20% boost)
     length_factor = min(len(text) / 500, 0.2)
@@ -183,40 +1348,43 @@ def generate_investor_insight(sentiment, confidence, impact_score, prediction):
     key = (sentiment, conf_level)
     return insights.get(key, "Analysis complete. Monitor market conditions for updates.")
 
-def analyze_sentiment_trend(text):
-    """Analyze sentiment trend across paragraphs"""
+def split_trend_segments(text):
+    """Split text into the paragraphs (or sentences) used for trend analysis"""
     paragraphs = [p.strip() for p in text.split('\n\n') if p.strip()]
     
     if len(paragraphs) < 2:
         paragraphs = [s.strip() for s in re.split(r'[.!?]+', text) if len(s.strip()) > 20]
     
     if len(paragraphs) < 2:
-        return None
+        return []
     
-    sentiments = []
-    for para in paragraphs[:5]:  # Analyze up to 5 paragraphs
-        try:
-            # API Call
-            api_output = query_hf_api({"inputs": para[:512]})
-            
-            # Handle API list response (it returns a list of lists usually)
-            if isinstance(api_output, list) and len(api_output) > 0:
-                if isinstance(api_output[0], list): # Nested list [[{...}]]
-                   result = api_output[0][0]
-                else: # Flat list [{...}]
-                   result = api_output[0]
-                
-                sentiments.append(result['label'].lower())
-            else:
-                continue
-        except:
-            continue
+    return paragraphs[:5]  # Analyze up to 5 paragraphs
+
+@timed("trend")
+def analyze_sentiment_trend(text, segment_results=None):
+    """Analyze sentiment trend across paragraphs
+
+    `segment_results` can carry already-scored segments (from a batched call)
+    so no extra API request is made.
+    """
+    if segment_results is None:
+        segments = split_trend_segments(text)
+        if not segments:
+            return None
+        if HF_BATCH_INPUTS:
+            segment_results = query_sentiment_batch(segments)
+            if isinstance(segment_results, dict):
+                return None
+        else:
+            segment_results = collect_sentiment_fanout(submit_sentiment_fanout(segments))
+    
+    segment_results = [r for r in segment_results if r]
+    sentiments = [r['label'].lower() for r in segment_results]
     
     if len(sentiments) < 2:
         return None
     
-    sentiment_values = {'positive': 1, 'neutral': 0, 'negative': -1}
-    values = [sentiment_values.get(s, 0) for s in sentiments]
+    values = [expected_sentiment(r['scores']) for r in segment_results]
     
     first_half = sum(values[:len(values)//2]) / max(1, len(values)//2)
     second_half = sum(values[len(values)//2:]) / max(1, len(values) - len(values)//2)
@@ -251,6 +1419,38 @@ def static_files(path):
     return send_from_directory('frontend', path)
 
 # ------------------ ANALYZE API ------------------
+# The ticker depends only on the input text, so its stock fetch runs
+# alongside inference and is joined at the end. A fetch that misses
+# ANALYZE_STOCK_TIMEOUT is left out (it keeps running and fills the cache).
+# The pool has a thread per request thread (WEB_THREADS, as in gunicorn.conf.py),
+# so a fetch never queues behind other requests' fetches and eats its deadline;
+# Yahoo itself is still capped by YAHOO_MAX_CONCURRENCY.
+ANALYZE_STOCK_TIMEOUT = float(os.environ.get("ANALYZE_STOCK_TIMEOUT", 8))
+ANALYZE_STOCK_WORKERS = int(os.environ.get("WEB_THREADS", 256))
+ANALYZE_STOCK_EXECUTOR = ThreadPoolExecutor(max_workers=ANALYZE_STOCK_WORKERS, thread_name_prefix="analyze-stock")
+
+def submit_stock_fetch(text):
+    """Start fetching the detected ticker's stock data, returns (deadline, future) or None"""
+    detected_ticker = extract_ticker(text)
+    if not detected_ticker:
+        return None
+    deadline = time.monotonic() + ANALYZE_STOCK_TIMEOUT
+    return deadline, submit_in_context(ANALYZE_STOCK_EXECUTOR, fetch_stock_data_cached, detected_ticker, '1mo')
+
+def collect_stock_fetch(pending):
+    """Join the stock branch, returns (stock_data, timed_out)"""
+    if pending is None:
+        return None, False
+    deadline, future = pending
+    try:
+        return future.result(timeout=max(0, deadline - time.monotonic())), False
+    except FutureTimeoutError:  # not the builtin TimeoutError before Python 3.11
+        print(f"Stock fetch missed the {ANALYZE_STOCK_TIMEOUT}s deadline, responding without it")
+        return None, True
+    except Exception as e:
+        print(f"Stock fetch failed: {str(e)}")
+        return None, False
+
 @app.route('/analyze', methods=['POST'])
 def analyze():
     data = request.get_json()
@@ -260,33 +1460,54 @@ def analyze():
 
     text = data['text']
     
-    # Check for API Token
-    if not HF_API_TOKEN:
-        return jsonify({"error": "Configuration Error: HF_API_TOKEN is missing on server."}), 500
+    # Check backend configuration (API token etc.)
+    config_error = backend_config_error()
+    if config_error:
+        return jsonify({"error": config_error}), 500
+
+    # Stock data is fetched while the model runs
+    stock_pending = submit_stock_fetch(text)
 
-    # Call API
-    api_response = query_hf_api({"inputs": text[:512]})
+    stream_format = requested_stream_format()
+    if stream_format:
+        return Response(
+            stream_with_context(stream_analysis(text, stream_format, stock_pending)),
+            mimetype=STREAM_MIMETYPES[stream_format],
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+        )
+
+    # Call API once for the full text and all trend segments
+    segments = split_trend_segments(text)
+    if HF_BATCH_INPUTS:
+        batch_results = query_sentiment_batch([text] + segments)
+    else:
+        # Trend segments run in the background while the main text is scored
+        pending = submit_sentiment_fanout(segments)
+        batch_results = query_sentiment_batch([text])
+        if isinstance(batch_results, list):
+            batch_results += collect_sentiment_fanout(pending)
     
     # Error handling for API limits or loading
-    if isinstance(api_response, dict) and 'error' in api_response:
-        return jsonify({"error": f"Model API Error: {api_response.get('error')}"}), 503
+    if isinstance(batch_results, dict) and 'error' in batch_results:
+        return jsonify({"error": f"Model API Error: {batch_results.get('error')}"}), 503
         
     # Parse Response
-    # API usually returns [[{'label': 'positive', 'score': 0.9}]] or similar
-    try:
-        if isinstance(api_response, list) and len(api_response) > 0:
-             if isinstance(api_response[0], list):
-                 result = api_response[0][0]
-             else:
-                 result = api_response[0]
-                 
-             label = result['label'].lower()
-             score = result['score']
-        else:
-             return jsonify({"error": "Invalid response from AI Model"}), 500
-    except Exception as e:
-         return jsonify({"error": f"Parsing Error: {str(e)}"}), 500
+    result = batch_results[0]
+    if not result:
+        return jsonify({"error": "Invalid response from AI Model"}), 500
 
+    # Stock data
+    stock_data, timed_out = collect_stock_fetch(stock_pending)
+
+    analysis = build_analysis(text, result, batch_results[1:], stock_data)
+    if timed_out:
+        analysis["partial"] = ["stock"]
+    return json_response(analysis)
+
+def build_summary(text, result):
+    """Sentiment, confidence, impact and insight for already-scored model output"""
+    label = result['label'].lower()
+    score = result['score']
     confidence = round(score * 100, 2)
 
     if label == 'positive':
@@ -296,33 +1517,212 @@ def analyze():
     else:
         prediction = 'Neutral'
 
-    sentiment_scores = {"positive": 0.0, "neutral": 0.0, "negative": 0.0}
-    sentiment_scores[label] = score
+    sentiment_scores = dict(result['scores'])
 
     # Advanced AI metrics
     confidence_info = get_confidence_level(confidence)
-    impact = calculate_impact_score(text, label, confidence)
+    impact = calculate_impact_score(text, label, confidence, sentiment_scores)
     insight = generate_investor_insight(label, confidence, impact["score"], prediction)
-    trend = analyze_sentiment_trend(text)
-
-    # Stock data
-    detected_ticker = extract_ticker(text)
-    stock_data = None
-    
-    if detected_ticker:
-        stock_data = fetch_stock_data_cached(detected_ticker, period='1mo')
 
-    return jsonify({
+    return {
         "sentiment": label.capitalize(),
         "confidence": confidence,
         "confidenceLevel": confidence_info,
         "prediction": prediction,
         "scores": sentiment_scores,
         "impact": impact,
-        "insight": insight,
-        "trend": trend,
-        "stock": stock_data
-    })
+        "insight": insight
+    }
+
+def build_analysis(text, result, segment_results, stock_data):
+    """Assemble the /analyze response body from already-scored model output"""
+    analysis = build_summary(text, result)
+    analysis["trend"] = analyze_sentiment_trend(text, segment_results) if segment_results else None
+    analysis["stock"] = stock_data
+    return analysis
+
+# ------------------ STREAMING ANALYZE ------------------
+# /analyze?stream=ndjson (or sse, or a matching Accept header) sends the
+# summary as soon as the full text is scored; trend and stock follow as
+# separate events instead of holding the whole response back.
+STREAM_MIMETYPES = {"ndjson": "application/x-ndjson", "sse": "text/event-stream"}
+
+def requested_stream_format():
+    """'ndjson', 'sse' or None from ?stream= or the Accept header"""
+    stream = request.args.get('stream', '').lower()
+    if stream in STREAM_MIMETYPES:
+        return stream
+    if stream in ('1', 'true'):
+        return "ndjson"
+    accept = request.headers.get('Accept', '')
+    if "text/event-stream" in accept:
+        return "sse"
+    if "application/x-ndjson" in accept:
+        return "ndjson"
+    return None
+
+def format_stream_event(stream_format, event, payload):
+    if stream_format == "sse":
+        return f"event: {event}\ndata: {app.json.dumps(payload)}\n\n"
+    return app.json.dumps({"event": event, "data": payload}) + "\n"
+
+def submit_segment_scores(segments):
+    """Start scoring trend segments in the background"""
+    if not segments:
+        return None
+    if HF_BATCH_INPUTS:
+        return submit_in_context(FANOUT_EXECUTOR, query_sentiment_batch, segments)
+    return submit_sentiment_fanout(segments)
+
+def collect_segment_scores(pending):
+    """Segment results from submit_segment_scores, or None if they failed"""
+    if pending is None:
+        return None
+    if not HF_BATCH_INPUTS:
+        return collect_sentiment_fanout(pending)
+    try:
+        with METRICS.time("trend_wait"):
+            results = pending.result()
+    except Exception:
+        return None
+    return results if isinstance(results, list) else None
+
+def stream_analysis(text, stream_format, stock_pending=None):
+    """Yield summary, trend, stock and done events as each part is ready"""
+    pending = submit_segment_scores(split_trend_segments(text))
+
+    batch_results = query_sentiment_batch([text])
+    if isinstance(batch_results, dict) and 'error' in batch_results:
+        yield format_stream_event(stream_format, "error", {"error": f"Model API Error: {batch_results.get('error')}"})
+        return
+    result = batch_results[0]
+    if not result:
+        yield format_stream_event(stream_format, "error", {"error": "Invalid response from AI Model"})
+        return
+
+    yield format_stream_event(stream_format, "summary", build_summary(text, result))
+
+    segment_results = collect_segment_scores(pending)
+    trend = analyze_sentiment_trend(text, segment_results) if segment_results else None
+    yield format_stream_event(stream_format, "trend", trend)
+
+    stock_data, _ = collect_stock_fetch(stock_pending)
+    yield format_stream_event(stream_format, "stock", stock_data)
+
+    yield format_stream_event(stream_format, "done", {})
+
+# ------------------ BATCH ANALYZE API ------------------
+# Stock data is fetched for at most BATCH_MAX_SYMBOLS distinct tickers (the
+# most mentioned ones) under the same ANALYZE_STOCK_TIMEOUT as /analyze.
+BATCH_MAX_ITEMS = int(os.environ.get("BATCH_MAX_ITEMS", 5000))
+BATCH_MAX_SYMBOLS = int(os.environ.get("BATCH_MAX_SYMBOLS", 25))
+
+def parse_batch_body():
+    """Read texts from a JSON array or an NDJSON request body"""
+    data = request.get_json(silent=True)
+    if data is None:
+        # NDJSON: one JSON value (string or {"text": ...}) per line
+        data = []
+        for line in request.get_data(as_text=True).splitlines():
+            if line.strip():
+                data.append(json.loads(line))
+    elif isinstance(data, dict):
+        data = data.get('texts', [])
+
+    if not isinstance(data, list):
+        raise ValueError("Expected a JSON array or NDJSON body")
+
+    texts = []
+    for item in data:
+        if isinstance(item, dict):
+            item = item.get('text', '')
+        texts.append(item if isinstance(item, str) else '')
+    return texts
+
+def collect_stocks_fetch(deadline, pending):
+    """Join a submit_stocks_fetch future, keeping the symbols done by the deadline"""
+    if pending is None:
+        return {}
+    try:
+        futures = pending.result(timeout=max(0, deadline - time.monotonic()))
+    except FutureTimeoutError:
+        print(f"Batch stock fetch missed the {ANALYZE_STOCK_TIMEOUT}s deadline, responding without it")
+        return {}
+    except Exception as e:
+        print(f"Batch stock fetch failed: {e}")
+        return {}
+
+    done, not_done = wait(futures.values(), timeout=max(0, deadline - time.monotonic()))
+    if not_done:
+        print(f"{len(not_done)} batch stock fetches missed the {ANALYZE_STOCK_TIMEOUT}s deadline")
+    stock_by_ticker = {}
+    for symbol, future in futures.items():
+        if future in done:
+            try:
+                stock_by_ticker[symbol] = future.result()
+            except Exception as e:
+                print(f"Stock fetch for {symbol} failed: {e}")
+    return stock_by_ticker
+
+@app.route('/analyze/batch', methods=['POST'])
+def analyze_batch():
+    try:
+        texts = parse_batch_body()
+    except ValueError as e:
+        return jsonify({"error": f"Invalid batch body: {str(e)}"}), 400
+
+    if not texts:
+        return jsonify({"error": "At least one text is required"}), 400
+    if len(texts) > BATCH_MAX_ITEMS:
+        return jsonify({"error": f"Batch too large (max {BATCH_MAX_ITEMS} items)"}), 413
+
+    # Check backend configuration (API token etc.)
+    config_error = backend_config_error()
+    if config_error:
+        return jsonify({"error": config_error}), 500
+
+    # Flatten every item's full text + trend segments into one input list
+    spans = []
+    inputs = []
+    for text in texts:
+        if not text.strip():
+            spans.append(None)
+            continue
+        segments = split_trend_segments(text)
+        spans.append((len(inputs), 1 + len(segments)))
+        inputs.append(text)
+        inputs.extend(segments)
+
+    # Fetch each distinct ticker once for the whole batch, while the texts are scored
+    tickers = [extract_ticker(t) if span else None for t, span in zip(texts, spans)]
+    distinct = [t for t, _ in Counter(t for t in tickers if t).most_common(BATCH_MAX_SYMBOLS)]
+    deadline = time.monotonic() + ANALYZE_STOCK_TIMEOUT
+    stocks = submit_in_context(ANALYZE_STOCK_EXECUTOR, submit_stocks_fetch, distinct, '1mo') if distinct else None
+
+    outputs = query_sentiment_chunked(inputs)
+
+    stock_by_ticker = collect_stocks_fetch(deadline, stocks)
+
+    results = []
+    for text, span, ticker in zip(texts, spans, tickers):
+        if span is None:
+            results.append({"error": "Text input is required"})
+            continue
+        offset, length = span
+        result = outputs[offset]
+        if result is None:
+            results.append({"error": "Invalid response from AI Model"})
+        elif 'error' in result:
+            results.append({"error": f"Model API Error: {result['error']}"})
+        else:
+            segment_results = [r if r and 'error' not in r else None
+                               for r in outputs[offset + 1:offset + length]]
+            analysis = build_analysis(text, result, segment_results, stock_by_ticker.get(ticker))
+            if ticker and ticker not in stock_by_ticker:
+                analysis["partial"] = ["stock"]
+            results.append(analysis)
+
+    return json_response({"count": len(results), "results": results})
 
 def get_related_stocks(symbol, sector):
     """Get related stocks based on symbol or sector"""
@@ -359,8 +1759,184 @@ def get_related_stocks(symbol, sector):
     
     return ['AAPL', 'MSFT', 'GOOGL', 'AMZN'] # Generic fallback
 
-# ------------------ STOCK API ------------------
-# ------------------ STOCK DATA CACHE MANAGER ------------------
+# ------------------ STOCK CACHE BACKENDS ------------------
+# Both backends store (value, expires_at) per key with their own TTL and
+# evict the least recently used entries beyond `max_entries`.
+class MemoryStockCache:
+    """Per-process LRU cache"""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()  # key -> (expires_at, value)
+        self.lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, key):
+        """Return (value, expires_at) or None. Expired entries are returned too"""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            self.entries.move_to_end(key)
+            return entry[1], entry[0]
+
+    def set(self, key, value, ttl):
+        with self.lock:
+            self.entries[key] = (time.time() + ttl, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def acquire_lease(self, key, ttl):
+        # Single process: SingleFlight already serialises fetches
+        return True
+
+    def release_lease(self, key):
+        pass
+
+    def lease_held(self, key):
+        return False
+
+    def __len__(self):
+        return len(self.entries)
+
+class SQLiteStockCache:
+    """LRU cache in a WAL-mode SQLite file shared by all workers on the host"""
+
+    def __init__(self, path, max_entries):
+        self.path = path
+        self.max_entries = max_entries
+        self.local = threading.local()
+        self.evictions = 0
+        self.writes = 0
+        conn = self.connect()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS stock_cache ("
+            " key TEXT PRIMARY KEY, value TEXT NOT NULL,"
+            " expires_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS stock_cache_accessed ON stock_cache (accessed_at)")
+        conn.execute("CREATE TABLE IF NOT EXISTS stock_cache_leases (key TEXT PRIMARY KEY, expires_at REAL NOT NULL)")
+
+    def connect(self):
+        # One connection per thread and process (connections must not cross fork())
+        conn = getattr(self.local, 'conn', None)
+        if conn is None or self.local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self.local.conn = conn
+            self.local.pid = os.getpid()
+        return conn
+
+    def get(self, key):
+        """Return (value, expires_at) or None. Expired entries are returned too"""
+        conn = self.connect()
+        row = conn.execute(
+            "SELECT value, expires_at, accessed_at FROM stock_cache WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        # Hits are reads; the recency used for eviction is only refreshed once
+        # per STOCK_CACHE_TOUCH_SECONDS, so workers don't queue on the write lock
+        now = time.time()
+        if now - row[2] >= STOCK_CACHE_TOUCH_SECONDS:
+            conn.execute("UPDATE stock_cache SET accessed_at = ? WHERE key = ?", (now, key))
+        return json.loads(row[0]), row[1]
+
+    def set(self, key, value, ttl):
+        conn = self.connect()
+        now = time.time()
+        conn.execute(
+            "INSERT OR REPLACE INTO stock_cache (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)",
+            (key, app.json.dumps(value), now + ttl, now)
+        )
+        self.writes += 1
+        if self.writes % 50 == 0:
+            self.prune(conn)
+
+    def prune(self, conn):
+        """Evict least recently used entries beyond max_entries"""
+        excess = len(self) - self.max_entries
+        if excess > 0:
+            conn.execute(
+                "DELETE FROM stock_cache WHERE key IN "
+                "(SELECT key FROM stock_cache ORDER BY accessed_at LIMIT ?)", (excess,)
+            )
+            self.evictions += excess
+
+    def acquire_lease(self, key, ttl):
+        """Claim the right to fetch `key` across workers; False if someone holds it"""
+        conn = self.connect()
+        now = time.time()
+        conn.execute("DELETE FROM stock_cache_leases WHERE key = ? AND expires_at < ?", (key, now))
+        cursor = conn.execute(
+            "INSERT OR IGNORE INTO stock_cache_leases (key, expires_at) VALUES (?, ?)", (key, now + ttl)
+        )
+        return cursor.rowcount == 1
+
+    def release_lease(self, key):
+        self.connect().execute("DELETE FROM stock_cache_leases WHERE key = ?", (key,))
+
+    def lease_held(self, key):
+        """True while some worker holds an unexpired lease on `key`"""
+        row = self.connect().execute(
+            "SELECT 1 FROM stock_cache_leases WHERE key = ? AND expires_at >= ?", (key, time.time())
+        ).fetchone()
+        return row is not None
+
+    def __len__(self):
+        return self.connect().execute("SELECT COUNT(*) FROM stock_cache").fetchone()[0]
+
+# ------------------ SINGLE-FLIGHT FETCHES ------------------
+STOCK_FETCH_LEASE_SECONDS = 30  # Upper bound on one Yahoo fetch
+
+class SingleFlight:
+    """Run at most one call per key at a time; concurrent callers share its result"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls = {}  # key -> {"done": Event, "result": ..., "error": ...}
+
+    def do(self, key, fn):
+        with self.lock:
+            call = self.calls.get(key)
+            leader = call is None
+            if leader:
+                call = {"done": threading.Event(), "result": None, "error": None}
+                self.calls[key] = call
+
+        if not leader:
+            call["done"].wait()
+            if call["error"] is not None:
+                raise call["error"]
+            return call["result"]
+
+        try:
+            call["result"] = fn()
+        except Exception as e:
+            call["error"] = e
+            raise
+        finally:
+            with self.lock:
+                del self.calls[key]
+            call["done"].set()
+        return call["result"]
+
+STOCK_FETCHES = SingleFlight()
+
+def create_stock_cache():
+    if STOCK_CACHE_BACKEND == "sqlite":
+        try:
+            return SQLiteStockCache(STOCK_CACHE_PATH, STOCK_CACHE_MAX_ENTRIES)
+        except sqlite3.Error as e:
+            print(f"WARNING: SQLite stock cache unavailable ({e}), using in-memory cache")
+    return MemoryStockCache(STOCK_CACHE_MAX_ENTRIES)
+
+STOCK_CACHE = create_stock_cache()
+
+# ------------------ MOCK DATA ------------------
 def generate_mock_data(symbol, period='1mo'):
     """Generate realistic looking mock data when API fails"""
     import random
@@ -371,6 +1947,7 @@ def generate_mock_data(symbol, period='1mo'):
     
     dates = []
     prices = []
+    opens = []
     
     days = 30 if period == '1mo' else 7 if period == '5d' else 1
     points = 30 if period == '1mo' else 70  # simplified
@@ -383,7 +1960,8 @@ def generate_mock_data(symbol, period='1mo'):
         date = end_date - timedelta(days=points-i)
         dates.append(date.strftime('%Y-%m-%d'))
         
-        # Random walk
+        # Random walk, each bar opening at the previous close
+        opens.append(round(current_price, 2))
         change = random.uniform(-0.02, 0.02)
         current_price = current_price * (1 + change)
         prices.append(round(current_price, 2))
@@ -396,9 +1974,10 @@ def generate_mock_data(symbol, period='1mo'):
         "changePercent": round((current_price - prices[0]) / prices[0] * 100, 2),
         "dates": dates,
         "prices": prices,
+        "open": opens,
         "volume": [random.randint(1000000, 5000000) for _ in range(points)],
-        "high": [p * 1.01 for p in prices],
-        "low": [p * 0.99 for p in prices],
+        "high": [round(max(o, p) * 1.01, 2) for o, p in zip(opens, prices)],
+        "low": [round(min(o, p) * 0.99, 2) for o, p in zip(opens, prices)],
         "dayOpenStats": round(prices[-1] * 0.99, 2),
         "dayHigh": round(prices[-1] * 1.01, 2),
         "dayLow": round(prices[-1] * 0.98, 2),
@@ -414,108 +1993,1002 @@ def generate_mock_data(symbol, period='1mo'):
         "volatility": 15
     }
 
-def fetch_stock_data_cached(symbol, period='1mo'):
-    symbol = symbol.upper()
-    cache_key = f"{symbol}_{period}"
-    current_time = time.time()
-    
-    # 1. Check Cache
-    if cache_key in STOCK_CACHE:
-        timestamp, data = STOCK_CACHE[cache_key]
-        if current_time - timestamp < CACHE_DURATION:
-            print(f"Serving {symbol} from cache")
-            data['from_cache'] = True
-            return data
-
-    # 2. Setup Interval
+# ------------------ OHLCV BAR STORE ------------------
+# Bars are kept on disk per (symbol, interval) as fixed-width binary records,
+# so a refresh only downloads bars newer than the last stored one and any
+# period is a slice of local data. Yahoo adjusts past bars for splits and
+# dividends, so every download overlaps one completed stored bar and a
+# changed close triggers a full re-download. Set BAR_STORE_DIR="" to disable.
+BAR_STORE_DIR = os.environ.get("BAR_STORE_DIR", os.path.join(tempfile.gettempdir(), "market_movement_bars"))
+BAR_FIELDS = [
+    ('ts', '<i8'),  # exchange-local wall clock, seconds since epoch
+    ('open', '<f8'), ('high', '<f8'), ('low', '<f8'), ('close', '<f8'), ('volume', '<f8'),
+]
+BAR_BASIS_TOLERANCE = 1e-4  # relative close drift that means history was re-adjusted
+INTRADAY_HISTORY_DAYS = 55  # Yahoo only serves ~60 days of intraday bars
+PERIOD_MONTHS = {'1mo': 1, '3mo': 3, '6mo': 6, '1y': 12, '2y': 24, '5y': 60, '10y': 120}
+
+@functools.cache
+def bar_dtype():
+    """numpy record type of one stored bar (built on first use, numpy loads lazily)"""
+    return np.dtype(BAR_FIELDS)
+
+def period_start(period):
+    """Earliest timestamp (local epoch seconds) a period needs, or None for "max\""""
+    now = pd.Timestamp.now().normalize()
+    if period.endswith('d') and period[:-1].isdigit():
+        # Trading days: allow for weekends and holidays
+        start = now - pd.Timedelta(days=int(period[:-1]) * 7 // 5 + 4)
+    elif period == 'ytd':
+        start = now.replace(month=1, day=1)
+    elif period in PERIOD_MONTHS:
+        start = now - pd.DateOffset(months=PERIOD_MONTHS[period])
+    else:
+        return None
+    return int(start.to_datetime64().astype('datetime64[s]').astype(np.int64))
+
+def slice_period(bars, period):
+    """Select the bars belonging to a Yahoo-style period"""
+    if len(bars) == 0:
+        return bars
+    if period.endswith('d') and period[:-1].isdigit():
+        days = bars['ts'] // 86400
+        keep = np.unique(days)[-int(period[:-1]):]
+        return bars[days >= keep[0]]
+    start = period_start(period)
+    return bars if start is None else bars[bars['ts'] >= start]
+
+class BarStore:
+    """Append-only on-disk OHLCV bars, refreshed incrementally from Yahoo"""
+
+    def __init__(self, root):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def paths(self, symbol, interval):
+        safe = re.sub(r'[^A-Z0-9.^=-]', '_', symbol.upper())
+        base = os.path.join(self.root, f"{safe}_{interval}")
+        return base + ".bin", base + ".json", base + ".lock"
+
+    def read(self, symbol, interval):
+        bin_path, meta_path, _ = self.paths(symbol, interval)
+        if not os.path.exists(bin_path):
+            return np.empty(0, dtype=bar_dtype()), {}
+        bars = np.fromfile(bin_path, dtype=bar_dtype())
+        try:
+            with open(meta_path) as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            meta = {}
+        return bars, meta
+
+    def read_locked(self, symbol, interval):
+        """read() under a shared lock, so a concurrent write is never seen half done"""
+        _, _, lock_path = self.paths(symbol, interval)
+        with open(lock_path, 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_SH)
+            try:
+                return self.read(symbol, interval)
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def write(self, symbol, interval, new_bars, meta, keep=None):
+        """Keep the first `keep` stored bars (None = none) and append new_bars"""
+        bin_path, meta_path, _ = self.paths(symbol, interval)
+        mode = 'r+b' if keep is not None and os.path.exists(bin_path) else 'wb'
+        with open(bin_path, mode) as f:
+            if keep is not None:
+                f.seek(keep * bar_dtype().itemsize)
+                f.truncate()
+            new_bars.tofile(f)
+        with open(meta_path, 'w') as f:
+            json.dump(meta, f)
+
+    @staticmethod
+    def frame_to_bars(hist):
+        index = hist.index.tz_localize(None) if hist.index.tz is not None else hist.index
+        bars = np.empty(len(hist), dtype=bar_dtype())
+        bars['ts'] = index.values.astype('datetime64[s]').astype(np.int64)
+        for field, column in (('open', 'Open'), ('high', 'High'), ('low', 'Low'),
+                              ('close', 'Close'), ('volume', 'Volume')):
+            bars[field] = hist[column].to_numpy(dtype=float)
+        return bars
+
+    @staticmethod
+    def bars_to_frame(bars):
+        return pd.DataFrame({
+            'Open': bars['open'], 'High': bars['high'], 'Low': bars['low'],
+            'Close': bars['close'], 'Volume': bars['volume'].astype(np.int64),
+        }, index=pd.to_datetime(bars['ts'], unit='s'))
+
+    def history(self, symbol, period, interval):
+        """Return a period of bars as a DataFrame, fetching only what is missing"""
+        _, _, lock_path = self.paths(symbol, interval)
+        with open(lock_path, 'a') as lock:
+            # Serialise refreshes of one file across threads and workers
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                bars = self.refresh(symbol, period, interval)
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+        return self.bars_to_frame(slice_period(bars, period))
+
+    def refresh(self, symbol, period, interval):
+        bars, meta = self.read(symbol, interval)
+        start = period_start(period)
+        covers_from = meta.get('covers_from')
+        intraday = not interval.endswith(('d', 'wk', 'mo'))
+        too_old = len(bars) > 0 and intraday and \
+            time.time() - bars['ts'][-1] > INTRADAY_HISTORY_DAYS * 86400
+
+        if len(bars) == 0 or too_old or covers_from is None:
+            need_full = True
+        elif start is None:
+            need_full = covers_from != 0  # "max" needs everything
+        else:
+            need_full = start < covers_from
+
+        ticker = yf.Ticker(symbol)
+        if need_full:
+            # Not enough local history for this period: download it whole
+            print(f"Fetching {symbol} {period} {interval} bars from Yahoo Finance...")
+            with YAHOO_LIMIT:
+                hist = ticker.history(period=period, interval=interval)
+            return self.merge(symbol, interval, bars, meta, self.frame_to_bars(hist),
+                              covers_from=0 if start is None else start, reset=too_old)
+
+        # Incremental: re-download from the last completed bar's day, so one
+        # bar overlaps the stored ones, and replace everything from there on
+        # (the last stored bar may still be forming)
+        anchor = bars['ts'][-2] if len(bars) > 1 else bars['ts'][-1]
+        since = pd.to_datetime(anchor, unit='s').strftime('%Y-%m-%d')
+        print(f"Fetching {symbol} {interval} bars since {since} from Yahoo Finance...")
+        with YAHOO_LIMIT:
+            hist = ticker.history(start=since, interval=interval)
+        new_bars = self.frame_to_bars(hist)
+        if self.basis_changed(bars, new_bars):
+            # A split or dividend re-adjusted the past: stored bars are stale
+            print(f"{symbol} {interval} history was re-adjusted, fetching {period} again...")
+            with YAHOO_LIMIT:
+                hist = ticker.history(period=period, interval=interval)
+            return self.merge(symbol, interval, bars, meta, self.frame_to_bars(hist),
+                              covers_from=0 if start is None else start, reset=True)
+        return self.merge(symbol, interval, bars, meta, new_bars)
+
+    @staticmethod
+    def basis_changed(bars, new_bars):
+        """True if the newest completed stored bar that new_bars also holds
+        has a different close, i.e. Yahoo adjusted history since it was stored"""
+        completed = bars[:-1]
+        _, old_idx, new_idx = np.intersect1d(completed['ts'], new_bars['ts'], return_indices=True)
+        if not len(old_idx):
+            return False
+        old_close = completed['close'][old_idx[-1]]
+        new_close = new_bars['close'][new_idx[-1]]
+        return not np.isclose(old_close, new_close, rtol=BAR_BASIS_TOLERANCE, atol=0)
+
+    def merge(self, symbol, interval, bars, meta, new_bars, covers_from=None, reset=False):
+        """Replace stored bars from new_bars' first timestamp on; returns all bars"""
+        meta = dict(meta)
+        if covers_from is not None:
+            old = meta.get('covers_from')
+            meta['covers_from'] = covers_from if old is None or reset else min(old, covers_from)
+        if len(new_bars) == 0:
+            # Nothing to store, but remember how far back we looked so the
+            # next request for this period doesn't download it all again
+            if covers_from is not None:
+                self.write(symbol, interval, new_bars, meta, keep=len(bars))
+            return bars
+        if reset or not len(bars):
+            keep = 0
+        else:
+            keep = int(np.searchsorted(bars['ts'], new_bars['ts'][0], side='left'))
+        self.write(symbol, interval, new_bars, meta, keep=keep)
+        return np.concatenate([bars[:keep], new_bars])
+
+    def ingest(self, symbol, period, interval, hist):
+        """Store a full-period frame downloaded elsewhere (e.g. in a batch)"""
+        _, _, lock_path = self.paths(symbol, interval)
+        start = period_start(period)
+        with open(lock_path, 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                bars, meta = self.read(symbol, interval)
+                new_bars = self.frame_to_bars(hist)
+                bars = self.merge(symbol, interval, bars, meta, new_bars,
+                                  covers_from=0 if start is None else start,
+                                  reset=self.basis_changed(bars, new_bars))
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+        return self.bars_to_frame(slice_period(bars, period))
+
+def create_bar_store():
+    if not BAR_STORE_DIR:
+        return None
+    try:
+        return BarStore(BAR_STORE_DIR)
+    except OSError as e:
+        print(f"WARNING: OHLCV bar store unavailable ({e}), fetching full history each time")
+        return None
+
+BAR_STORE = create_bar_store()
+
+# ------------------ STOCK DATA TIERS ------------------
+# Each piece of stock data is cached under its own key and TTL, so most
+# refreshes only touch the cheap quote call.
+QUOTE_TTL = int(os.environ.get("QUOTE_TTL", 15))  # seconds
+INTRADAY_TTL = int(os.environ.get("INTRADAY_TTL", 120))
+NEWS_TTL = int(os.environ.get("NEWS_TTL", 900))
+PROFILE_TTL = int(os.environ.get("PROFILE_TTL", 6 * 3600))  # fundamentals, description, calendar
+
+def get_interval(period):
+    """Bar interval used for a history period"""
     interval = '1d'
     if period == '1d': interval = '5m'
     elif period == '5d': interval = '15m'
     elif period == '1mo': interval = '90m'
-    
+    return interval
+
+def seconds_until_next_close():
+    """Seconds until the next US market close (16:00 New York, weekdays)"""
     try:
-        # 3. Try Fetching from API
-        print(f"Fetching {symbol} from Yahoo Finance...")
-        ticker = yf.Ticker(symbol)
-        info = ticker.info
-        
-        # Basic validation (yahoo sometimes returns empty info for bad requests)
-        curr_price = info.get('currentPrice') or info.get('regularMarketPrice')
-        
-        if not curr_price:
-            # Try to get price from history if info is missing
-            hist = ticker.history(period='1d')
-            if not hist.empty:
-                curr_price = hist['Close'].iloc[-1]
-            else:
-                raise Exception("No price data found")
+        now = datetime.now(ZoneInfo("America/New_York"))
+    except Exception:
+        now = datetime.now(timezone(timedelta(hours=-5)))
+    close = now.replace(hour=16, minute=0, second=0, microsecond=0)
+    if now >= close:
+        close += timedelta(days=1)
+    while close.weekday() >= 5:
+        close += timedelta(days=1)
+    return max(60, (close - now).total_seconds())
 
-        current_price = float(curr_price)
-        previous_close = info.get('previousClose', current_price)
-        change = current_price - previous_close
-        change_percent = (change / previous_close * 100) if previous_close else 0
-        
-        hist = ticker.history(period=period, interval=interval)
-        
-        if hist.empty:
-             raise Exception("Empty history")
-
-        stock_info = {
-            "symbol": symbol,
-            "name": info.get('shortName', symbol),
-            "price": round(current_price, 2),
-            "change": round(change, 2),
-            "changePercent": round(change_percent, 2),
-            "dates": hist.index.strftime('%Y-%m-%d').tolist(),
-            "prices": hist['Close'].round(2).tolist(),
-            "open": hist['Open'].round(2).tolist(),
-            "volume": hist['Volume'].tolist(),
-            "high": hist['High'].round(2).tolist(),
-            "low": hist['Low'].round(2).tolist(),
-            # Extended Stats
-            "dayOpenStats": info.get('open'),
-            "dayHigh": info.get('dayHigh'),
-            "dayLow": info.get('dayLow'),
-            "mktCap": info.get('marketCap'),
-            "peRatio": info.get('trailingPE'),
-            "dividendYield": info.get('dividendYield'),
-            "fiftyTwoWeekHigh": info.get('fiftyTwoWeekHigh'),
-            "fiftyTwoWeekLow": info.get('fiftyTwoWeekLow'),
-            "volumeAvg": info.get('averageVolume'),
-            "sector": info.get('sector'),
-            "industry": info.get('industry'),
-            "website": info.get('website'),
-            "description": info.get('longBusinessSummary'),
-            # Lists
-            "news": ticker.news[:5] if hasattr(ticker, 'news') else [],
-            "earnings": ticker.calendar.get('Earnings Date', []) if hasattr(ticker, 'calendar') and isinstance(ticker.calendar, dict) else [],
-            "related": get_related_stocks(symbol, info.get('sector')),
-             # Risk Metrics
-            "volatility": hist['Close'].pct_change().std() * (252 ** 0.5) * 100 if len(hist) > 1 else 0
+def history_ttl(interval):
+    # Intraday bars move all session; daily bars only change at the close
+    if interval.endswith('m') or interval.endswith('h'):
+        return INTRADAY_TTL
+    return seconds_until_next_close()
+
+def to_float(value):
+    """float() that maps None/NaN to None so responses stay valid JSON"""
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    return None if value != value else value
+
+def load_quote(symbol):
+    """Quote tier: last price and day stats from the lightweight fast_info"""
+    print(f"Fetching {symbol} quote from Yahoo Finance...")
+    with YAHOO_LIMIT:
+        # fast_info fetches lazily, on attribute access
+        fast = yf.Ticker(symbol).fast_info
+        price = to_float(fast.last_price)
+        if not price:
+            raise Exception("No price data found")
+        return {
+            "price": price,
+            "previousClose": to_float(fast.previous_close) or price,
+            "dayOpen": to_float(fast.open),
+            "dayHigh": to_float(fast.day_high),
+            "dayLow": to_float(fast.day_low),
+            "mktCap": to_float(fast.market_cap),
+            "fiftyTwoWeekHigh": to_float(fast.year_high),
+            "fiftyTwoWeekLow": to_float(fast.year_low),
         }
-        
-        # 4. Save to Cache
-        STOCK_CACHE[cache_key] = (current_time, stock_info)
-        return stock_info
-        
+
+def load_history(symbol, period, interval):
+    """History tier: OHLCV bars for one period/interval"""
+    if BAR_STORE is not None:
+        hist = BAR_STORE.history(symbol, period, interval)
+    else:
+        print(f"Fetching {symbol} {period} history from Yahoo Finance...")
+        with YAHOO_LIMIT:
+            hist = yf.Ticker(symbol).history(period=period, interval=interval)
+    if hist.empty:
+        raise Exception("Empty history")
+    return history_payload(hist)
+
+def history_payload(hist):
+    """JSON-ready history tier value from an OHLCV DataFrame"""
+    index = hist.index.tz_localize(None) if hist.index.tz is not None else hist.index
+    return {
+        "dates": hist.index.strftime('%Y-%m-%d').tolist(),
+        # Exchange-local wall clock, like the bar store; used by compact responses
+        "ts": index.values.astype('datetime64[s]').astype(np.int64).tolist(),
+        "prices": hist['Close'].round(2).tolist(),
+        "open": hist['Open'].round(2).tolist(),
+        "volume": hist['Volume'].tolist(),
+        "high": hist['High'].round(2).tolist(),
+        "low": hist['Low'].round(2).tolist(),
+        # Risk Metrics
+        "volatility": to_float(hist['Close'].pct_change().std() * (252 ** 0.5) * 100) or 0 if len(hist) > 1 else 0,
+    }
+
+def load_profile(symbol):
+    """Profile tier: fundamentals and company description from ticker.info"""
+    print(f"Fetching {symbol} profile from Yahoo Finance...")
+    with YAHOO_LIMIT:
+        info = yf.Ticker(symbol).info
+    return {
+        "name": info.get('shortName', symbol),
+        "peRatio": info.get('trailingPE'),
+        "dividendYield": info.get('dividendYield'),
+        "volumeAvg": info.get('averageVolume'),
+        "sector": info.get('sector'),
+        "industry": info.get('industry'),
+        "website": info.get('website'),
+        "description": info.get('longBusinessSummary'),
+    }
+
+def load_news(symbol):
+    ticker = yf.Ticker(symbol)
+    with YAHOO_LIMIT:
+        return ticker.news[:5] if hasattr(ticker, 'news') else []
+
+def load_calendar(symbol):
+    ticker = yf.Ticker(symbol)
+    with YAHOO_LIMIT:
+        calendar = ticker.calendar if hasattr(ticker, 'calendar') else None
+    return calendar.get('Earnings Date', []) if isinstance(calendar, dict) else []
+
+def stock_tiers(symbol, period):
+    """(name, cache_key, ttl, loader, required) for every tier of a stock response"""
+    interval = get_interval(period)
+    return [
+        ("quote", f"quote:{symbol}", QUOTE_TTL, lambda: load_quote(symbol), True),
+        ("history", f"history:{symbol}:{period}:{interval}", lambda: history_ttl(interval),
+         lambda: load_history(symbol, period, interval), True),
+        ("profile", f"profile:{symbol}", PROFILE_TTL, lambda: load_profile(symbol), False),
+        ("news", f"news:{symbol}", NEWS_TTL, lambda: load_news(symbol), False),
+        ("calendar", f"calendar:{symbol}", PROFILE_TTL, lambda: load_calendar(symbol), False),
+    ]
+
+def get_fresh_cached(cache_key):
+    """Return the cached value for a key if it hasn't expired"""
+    cached = STOCK_CACHE.get(cache_key)
+    if cached is not None and time.time() < cached[1]:
+        return cached
+    return None
+
+def yahoo_error_status(error):
+    """Status label for a failed Yahoo call (yfinance raises plain exceptions)"""
+    if isinstance(error, UpstreamBusy):
+        return guard_error_status(error)
+    if "Too Many Requests" in str(error) or "429" in str(error):
+        return "429"
+    return "error"
+
+def run_yahoo_loader(loader):
+    """Call a tier loader, timing it and counting its failures"""
+    try:
+        with METRICS.time("yahoo"):
+            return loader()
     except Exception as e:
-        print(f"Error fetching {symbol}: {e}")
-        # 5. FALLBACK TO MOCK DATA (Rate Limit handling)
-        if "Too Many Requests" in str(e) or "429" in str(e) or "No data" in str(e):
-             print("Activiting Fallback Mode for Rate Limit")
-             mock_data = generate_mock_data(symbol, period)
-             return mock_data
-        
-        # Return mock data anyway for general errors to keep UI alive
-        return generate_mock_data(symbol, period)
+        METRICS.inc("upstream_errors_total", upstream="yahoo", status=yahoo_error_status(e))
+        raise
+
+def load_tier_leased(cache_key, ttl, loader):
+    """Load one tier under a cross-worker lease so only one worker calls Yahoo per key"""
+    # A flight that finished just before ours may already have filled the cache
+    cached = get_fresh_cached(cache_key)
+    if cached is not None:
+        return cached[0]
+
+    leased = STOCK_CACHE.acquire_lease(cache_key, STOCK_FETCH_LEASE_SECONDS)
+    if not leased:
+        # Another worker is fetching this key: wait for its result
+        deadline = time.time() + STOCK_FETCH_LEASE_SECONDS
+        while time.time() < deadline:
+            time.sleep(0.1)
+            cached = get_fresh_cached(cache_key)
+            if cached is not None:
+                return cached[0]
+            if not STOCK_CACHE.lease_held(cache_key):
+                # The leader fills the cache before releasing, so a released
+                # lease with no entry means its fetch failed (e.g. a 429)
+                cached = get_fresh_cached(cache_key)
+                if cached is not None:
+                    return cached[0]
+                raise Exception(f"Fetch of {cache_key} failed in another worker")
+
+    try:
+        value = run_yahoo_loader(loader)
+        STOCK_CACHE.set(cache_key, value, ttl() if callable(ttl) else ttl)
+        return value
+    finally:
+        if leased:
+            STOCK_CACHE.release_lease(cache_key)
+
+STOCK_CACHE_HIT = Metrics.key("stock_cache_requests_total", result="hit")
+STOCK_CACHE_STALE = Metrics.key("stock_cache_requests_total", result="stale")
+STOCK_CACHE_MISS = Metrics.key("stock_cache_requests_total", result="miss")
+
+def get_tier(cache_key, ttl, loader):
+    """Return (value, state) for one tier; state is "cached", "stale" or "fetched"""
+    start = time.perf_counter()
+    cached = STOCK_CACHE.get(cache_key)
+    METRICS.observe("stock_cache", time.perf_counter() - start)
+    if cached is not None:
+        value, expires_at = cached
+        now = time.time()
+        if now < expires_at:
+            METRICS.add(STOCK_CACHE_HIT)
+            return value, "cached"
+        if now - expires_at < STALE_MAX_AGE or YAHOO_LIMIT.is_open():
+            # Stale-while-revalidate: answer now, refresh off the request path.
+            # While Yahoo's circuit is open any cached value beats mock data.
+            METRICS.add(STOCK_CACHE_STALE)
+            refresh_in_background(cache_key, ttl, loader)
+            return value, "stale"
+
+    METRICS.add(STOCK_CACHE_MISS)
+
+    # Single-flight: one upstream fetch per key, concurrent callers share it
+    return STOCK_FETCHES.do(cache_key, lambda: load_tier_leased(cache_key, ttl, loader)), "fetched"
+
+# ------------------ STOCK DATA CACHE MANAGER ------------------
+@timed("stock_fetch")
+def fetch_stock_data_cached(symbol, period='1mo', compact=False, include=None):
+    """Stock response for one symbol. `include` picks the heavy fields to
+    send (default all), and `compact` swaps the OHLCV lists for encoded columns."""
+    symbol = symbol.upper()
+    include = STOCK_HEAVY_FIELDS if include is None else include
+    parts = {}
+    states = []
+    # Tiers that only feed excluded fields aren't fetched at all
+    skipped = {tier for field, tier in STOCK_HEAVY_FIELDS.items() if tier and field not in include}
+
+    for name, cache_key, ttl, loader, required in stock_tiers(symbol, period):
+        if name in skipped:
+            parts[name] = None
+            continue
+        try:
+            parts[name], state = get_tier(cache_key, ttl, loader)
+            states.append(state)
+        except Exception as e:
+            print(f"Error fetching {symbol} {name}: {e}")
+            if not required:
+                parts[name] = None
+                continue
+            # FALLBACK TO MOCK DATA (Rate Limit handling)
+            if "Too Many Requests" in str(e) or "429" in str(e) or "No data" in str(e):
+                print("Activiting Fallback Mode for Rate Limit")
+            # Return mock data anyway for general errors to keep UI alive
+            METRICS.inc("mock_fallbacks_total")
+            return shape_stock_data(generate_mock_data(symbol, period), None, period, compact, include)
+
+    if all(state != "fetched" for state in states):
+        print(f"Serving {symbol} from cache")
+
+    return shape_stock_data(assemble_stock_data(symbol, parts, states), parts["history"].get("ts"), period,
+                            compact, include)
+
+def assemble_stock_data(symbol, parts, states):
+    """Build the /stock response from the individually cached tiers"""
+    quote = parts["quote"]
+    history = parts["history"]
+    profile = parts["profile"] or {}
+
+    current_price = quote["price"]
+    previous_close = quote["previousClose"]
+    change = current_price - previous_close
+    change_percent = (change / previous_close * 100) if previous_close else 0
+
+    stock_info = {
+        "symbol": symbol,
+        "name": profile.get('name', symbol),
+        "price": round(current_price, 2),
+        "change": round(change, 2),
+        "changePercent": round(change_percent, 2),
+        "dates": history["dates"],
+        "prices": history["prices"],
+        "open": history["open"],
+        "volume": history["volume"],
+        "high": history["high"],
+        "low": history["low"],
+        # Extended Stats
+        "dayOpenStats": quote["dayOpen"],
+        "dayHigh": quote["dayHigh"],
+        "dayLow": quote["dayLow"],
+        "mktCap": quote["mktCap"],
+        "peRatio": profile.get('peRatio'),
+        "dividendYield": profile.get('dividendYield'),
+        "fiftyTwoWeekHigh": quote["fiftyTwoWeekHigh"],
+        "fiftyTwoWeekLow": quote["fiftyTwoWeekLow"],
+        "volumeAvg": profile.get('volumeAvg'),
+        "sector": profile.get('sector'),
+        "industry": profile.get('industry'),
+        "website": profile.get('website'),
+        "description": profile.get('description'),
+        # Lists
+        "news": parts["news"] or [],
+        "earnings": parts["calendar"] or [],
+        "related": get_related_stocks(symbol, profile.get('sector')),
+        # Risk Metrics
+        "volatility": history["volatility"],
+    }
+
+    if all(state != "fetched" for state in states):
+        stock_info["from_cache"] = True
+    if "stale" in states:
+        stock_info["stale"] = True
+    return stock_info
+
+# ------------------ COMPACT STOCK PAYLOAD ------------------
+# `?format=compact` replaces the per-bar lists with one "bars" block of
+# integer columns: epoch seconds and prices in fixed-point cents, each
+# delta-encoded against the previous bar. The small repeating integers are
+# several times shorter than float lists, compress far better, and decode
+# with one running sum per column on the client.
+# Heavy fields (description, news, earnings) are sent in compact responses
+# only when listed in `?include=`.
+STOCK_HEAVY_FIELDS = {"description": None, "news": "news", "earnings": "calendar"}  # field -> tier it needs
+BAR_COLUMNS = [("t", None, 1), ("open", "open", 100), ("high", "high", 100), ("low", "low", 100),
+               ("close", "prices", 100), ("volume", "volume", 1)]  # (column, response key, scale)
+
+def delta_encode(values, scale):
+    """Fixed-point integers, each stored as the difference from the previous one"""
+    values = pd.Series(values, dtype=float).ffill().fillna(0).to_numpy()
+    return np.diff(np.rint(values * scale).astype(np.int64), prepend=0).tolist()
+
+def delta_decode(deltas, scale):
+    return np.cumsum(deltas) / scale
+
+def encode_bars(data, ts, interval):
+    """"bars" block for a compact response, from the legacy per-bar lists"""
+    if ts is None or len(ts) != len(data["dates"]):
+        # Older cache entries and mock data only carry dates
+        ts = np.array(data["dates"], dtype='datetime64[s]').astype(np.int64)
+    columns, scales = {}, {}
+    for column, key, scale in BAR_COLUMNS:
+        values = ts if key is None else data.get(key)
+        if values is None:
+            continue
+        columns[column] = delta_encode(values, scale)
+        scales[column] = scale
+    return {"encoding": "delta", "interval": interval, "count": len(ts), "scale": scales, "columns": columns}
+
+def shape_stock_data(data, ts, period, compact, include):
+    """Drop heavy fields not in `include`, and encode the bars if compact"""
+    data = {k: v for k, v in data.items() if k not in STOCK_HEAVY_FIELDS or k in include}
+    if compact:
+        data["bars"] = encode_bars(data, ts, get_interval(period))
+        for _, key, _ in BAR_COLUMNS:
+            data.pop(key, None)
+        data.pop("dates", None)
+    return data
+
+def stock_closes(stock_data):
+    """Close prices of a stock response in either format"""
+    bars = stock_data.get("bars")
+    if bars is not None:
+        return delta_decode(bars["columns"]["close"], bars["scale"]["close"])
+    return np.asarray(stock_data.get('prices') or [], dtype=float)
+
+def parse_stock_format():
+    """(compact, include) from the ?format= and ?include= query parameters"""
+    compact = request.args.get('format', '').lower() == 'compact'
+    if 'include' in request.args:
+        include = {f.strip().lower() for f in request.args['include'].split(',')}
+    else:
+        # The full format keeps every field for existing clients
+        include = set() if compact else set(STOCK_HEAVY_FIELDS)
+    return compact, include
+
+def without_cache_flag(data):
+    return {k: without_cache_flag(v) if isinstance(v, dict) else v for k, v in data.items() if k != "from_cache"}
+
+def stock_etag(data):
+    """Weak ETag over a stock response, ignoring whether it came from cache"""
+    body = json.dumps(without_cache_flag(data), sort_keys=True, default=str)
+    return hashlib.blake2b(body.encode('utf-8'), digest_size=12).hexdigest()
+
+def conditional_response(data):
+    """json_response with an ETag; a matching If-None-Match gets 304 Not Modified"""
+    response = json_response(data)
+    response.set_etag(stock_etag(data), weak=True)
+    response.headers['Cache-Control'] = 'no-cache'  # reuse only after revalidating
+    return response.make_conditional(request)
+
+# ------------------ BACKGROUND REFRESH ------------------
+STALE_MAX_AGE = int(os.environ.get("STALE_MAX_AGE", 3600))  # seconds past expiry an entry may still be served
+REFRESH_AHEAD_SECONDS = int(os.environ.get("REFRESH_AHEAD_SECONDS", 60))
+# Tickers kept warm: "" (off), "default" (COMPANY_TICKERS + peers) or a comma separated list
+WARM_TICKERS = os.environ.get("WARM_TICKERS", "")
+WARM_PERIODS = [p.strip() for p in os.environ.get("WARM_PERIODS", "1mo").split(",") if p.strip()]
+# Yahoo budget of the warmers on this host: every gunicorn worker runs its
+# own warmer, so each takes an equal share of it
+WARM_MAX_FETCHES_PER_MINUTE = float(os.environ.get("WARM_MAX_FETCHES_PER_MINUTE", 30))
+WARM_WORKERS = max(1, int(os.environ.get("WEB_CONCURRENCY", 1)))
+if WARM_TICKERS and not WARM_MAX_FETCHES_PER_MINUTE > 0:
+    print("WARNING: WARM_MAX_FETCHES_PER_MINUTE must be positive, ticker warming is disabled.")
+    WARM_TICKERS = ""
 
+REFRESH_EXECUTOR = ThreadPoolExecutor(max_workers=4, thread_name_prefix="stock-refresh")
+REFRESHING = set()
+REFRESHING_LOCK = threading.Lock()
+WARMER_PID = None
+
+def refresh_in_background(cache_key, ttl, loader):
+    """Queue a refresh of one cache entry unless one is already queued"""
+    with REFRESHING_LOCK:
+        if cache_key in REFRESHING:
+            return
+        REFRESHING.add(cache_key)
+
+    def run():
+        try:
+            STOCK_FETCHES.do(cache_key, lambda: load_tier_leased(cache_key, ttl, loader))
+        except Exception as e:
+            print(f"Background refresh of {cache_key} failed: {e}")
+        finally:
+            with REFRESHING_LOCK:
+                REFRESHING.discard(cache_key)
+
+    REFRESH_EXECUTOR.submit(run)
+
+def get_warm_tickers():
+    """Resolve WARM_TICKERS into a list of symbols"""
+    if WARM_TICKERS.lower() == "default":
+        tickers = set(COMPANY_TICKERS.values())
+        for ticker in list(tickers):
+            tickers.update(get_related_stocks(ticker, None))
+        return sorted(tickers)
+    return [t.strip().upper() for t in WARM_TICKERS.split(",") if t.strip()]
+
+def warm_loop():
+    """Refresh warm tickers' tiers shortly before they expire, within the fetch budget"""
+    pause = 60 * WARM_WORKERS / WARM_MAX_FETCHES_PER_MINUTE
+    while True:
+        fetched = 0
+        for symbol in get_warm_tickers():
+            for period in WARM_PERIODS:
+                for name, cache_key, ttl, loader, required in stock_tiers(symbol, period):
+                    ttl_seconds = ttl() if callable(ttl) else ttl
+                    if ttl_seconds <= REFRESH_AHEAD_SECONDS:
+                        continue  # Short-lived quotes are left to stale-while-revalidate
+                    cached = STOCK_CACHE.get(cache_key)
+                    if cached is not None and cached[1] - time.time() > REFRESH_AHEAD_SECONDS:
+                        continue
+                    try:
+                        # Joining a request's in-flight load returns its value, not True
+                        did_fetch = STOCK_FETCHES.do(cache_key, lambda: refresh_tier_now(cache_key, ttl, loader)) is True
+                    except Exception as e:
+                        print(f"Warm refresh of {cache_key} failed: {e}")
+                        did_fetch = True  # it still reached Yahoo
+                    if not did_fetch:
+                        continue  # Another worker (or request) fetched it: no budget spent
+                    fetched += 1
+                    time.sleep(pause)
+        if not fetched:
+            time.sleep(5)
+
+def refresh_tier_now(cache_key, ttl, loader):
+    """Reload a tier even if its cached value is still fresh; False if another
+    worker holds its lease"""
+    if not STOCK_CACHE.acquire_lease(cache_key, STOCK_FETCH_LEASE_SECONDS):
+        return False  # Another worker's warmer has it
+    try:
+        STOCK_CACHE.set(cache_key, run_yahoo_loader(loader), ttl() if callable(ttl) else ttl)
+        return True
+    finally:
+        STOCK_CACHE.release_lease(cache_key)
+
+@app.before_request
+def ensure_warmer():
+    # Started per worker on its first request, since threads don't survive fork()
+    global WARMER_PID
+    if WARM_TICKERS and WARMER_PID != os.getpid():
+        WARMER_PID = os.getpid()
+        threading.Thread(target=warm_loop, daemon=True, name="stock-warmer").start()
+
+# ------------------ MULTI-SYMBOL FETCH ------------------
+STOCKS_MAX_SYMBOLS = int(os.environ.get("STOCKS_MAX_SYMBOLS", 25))
+STOCKS_EXECUTOR = ThreadPoolExecutor(max_workers=8, thread_name_prefix="stocks")
+
+def needs_fetch(cache_key):
+    """True if a key is missing or too old to serve even as stale"""
+    cached = STOCK_CACHE.get(cache_key)
+    return cached is None or time.time() - cached[1] >= STALE_MAX_AGE
+
+def prefetch_histories(symbols, period):
+    """Fill missing history tiers for many symbols with one batched download"""
+    interval = get_interval(period)
+    missing = [s for s in symbols if needs_fetch(f"history:{s}:{period}:{interval}")]
+    if len(missing) < 2:
+        return  # Nothing to batch: the per-symbol path handles it
+
+    print(f"Fetching {len(missing)} histories from Yahoo Finance in one batch...")
+    with YAHOO_LIMIT:
+        frames = yf.download(
+            missing, period=period, interval=interval, group_by='ticker',
+            threads=True, progress=False, auto_adjust=True, ignore_tz=True
+        )
+    for symbol in missing:
+        try:
+            hist = frames[symbol].dropna(how='all')
+        except KeyError:
+            continue
+        if hist.empty:
+            continue
+        if BAR_STORE is not None:
+            hist = BAR_STORE.ingest(symbol, period, interval, hist)
+        STOCK_CACHE.set(f"history:{symbol}:{period}:{interval}", history_payload(hist), history_ttl(interval))
+
+def submit_stocks_fetch(symbols, period='1mo', compact=False, include=None):
+    """One batched history download for the misses, then each symbol's
+    remaining tiers fetched concurrently; returns {symbol: future}"""
+    symbols = list(dict.fromkeys(s.upper() for s in symbols))
+    try:
+        prefetch_histories(symbols, period)
+    except Exception as e:
+        print(f"Batched history download failed: {e}")
+
+    return {s: submit_in_context(STOCKS_EXECUTOR, fetch_stock_data_cached, s, period, compact, include)
+            for s in symbols}
+
+def fetch_stocks_data_cached(symbols, period='1mo', compact=False, include=None):
+    """fetch_stock_data_cached for many symbols"""
+    futures = submit_stocks_fetch(symbols, period, compact, include)
+    return {s: future.result() for s, future in futures.items()}
+
+# ------------------ TECHNICAL INDICATORS ------------------
+# Indicators are computed over the full stored bar history (not just the
+# requested window) and memoized per (symbol, interval, indicator, params).
+# When bars are appended only the new tail is computed, continuing each
+# exponential average from its last stored value.
+INDICATOR_MEMO_SIZE = int(os.environ.get("INDICATOR_MEMO_SIZE", 512))
+INDICATOR_DEFAULTS = {"rsi": [14], "macd": [12, 26, 9], "ema": [20], "ma": [20]}
+INDICATOR_MEMO = OrderedDict()  # (symbol, interval, spec) -> {"ts", "close", "series"}
+INDICATOR_LOCK = threading.Lock()
+
+def parse_indicator_specs(raw):
+    """"rsi,macd:12:26:9,ma:50" -> [("rsi", (14,)), ("macd", (12, 26, 9)), ("ma", (50,))]"""
+    specs = []
+    for item in raw.split(','):
+        parts = item.strip().lower().split(':')
+        name = parts[0]
+        if name not in INDICATOR_DEFAULTS:
+            continue
+        try:
+            params = tuple(int(p) for p in parts[1:]) or tuple(INDICATOR_DEFAULTS[name])
+        except ValueError:
+            continue
+        if len(params) == len(INDICATOR_DEFAULTS[name]) and all(0 < p <= 1000 for p in params):
+            specs.append((name, params))
+    return specs
+
+def ema_continue(values, span=None, alpha=None, seed=None):
+    """EMA over values (adjust=False), continuing from a previous EMA value"""
+    series = pd.Series(values, dtype=float)
+    if seed is not None:
+        series = pd.concat([pd.Series([seed]), series], ignore_index=True)
+    out = series.ewm(span=span, alpha=alpha, adjust=False).mean().to_numpy()
+    return out[1:] if seed is not None else out
+
+def compute_indicator_series(name, params, close, prev=None, start=0):
+    """Indicator columns for close[start:], continuing from `prev` columns"""
+    tail = close[start:]
+    last = (lambda col: prev[col][start - 1]) if prev is not None and start > 0 else (lambda col: None)
+
+    if name == "ema":
+        return {"value": ema_continue(tail, span=params[0], seed=last("value"))}
+    if name == "ma":
+        n = params[0]
+        # Recompute the rolling window over just enough history to cover the tail
+        lead = max(0, start - n + 1)
+        means = pd.Series(close[lead:]).rolling(n, min_periods=1).mean().to_numpy()
+        return {"value": means[start - lead:]}
+    if name == "rsi":
+        n = params[0]
+        window = close[max(0, start - 1):]
+        delta = np.diff(window, prepend=window[0]) if start == 0 else np.diff(window)
+        gain = ema_continue(np.clip(delta, 0, None), alpha=1 / n, seed=last("avg_gain"))
+        loss = ema_continue(np.clip(-delta, 0, None), alpha=1 / n, seed=last("avg_loss"))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            rsi = np.where(loss == 0, 100.0, 100 - 100 / (1 + gain / loss))
+        return {"value": rsi, "avg_gain": gain, "avg_loss": loss}
+    if name == "macd":
+        fast, slow, signal_span = params
+        fast_ema = ema_continue(tail, span=fast, seed=last("fast"))
+        slow_ema = ema_continue(tail, span=slow, seed=last("slow"))
+        macd = fast_ema - slow_ema
+        signal = ema_continue(macd, span=signal_span, seed=last("signal"))
+        return {"macd": macd, "signal": signal, "histogram": macd - signal,
+                "fast": fast_ema, "slow": slow_ema}
+    raise ValueError(f"Unknown indicator {name}")
+
+def indicator_columns(symbol, interval, name, params, ts, close):
+    """Memoized indicator columns over the full bar history"""
+    memo_key = (symbol, interval, name, params)
+    with INDICATOR_LOCK:
+        memo = INDICATOR_MEMO.get(memo_key)
+        if memo is not None:
+            INDICATOR_MEMO.move_to_end(memo_key)
+
+    start = 0
+    if memo is not None:
+        # Bars are only ever appended (or the forming last bar replaced), so
+        # everything up to the first differing bar can be reused
+        n = min(len(memo["ts"]), len(ts))
+        same = (memo["ts"][:n] == ts[:n]) & (memo["close"][:n] == close[:n])
+        start = n if same.all() else int(np.argmin(same))
+        if start == len(ts) == len(memo["ts"]):
+            return memo["series"]
+
+    tail = compute_indicator_series(name, params, close, memo["series"] if start else None, start)
+    series = {col: np.concatenate([memo["series"][col][:start], values]) if start else values
+              for col, values in tail.items()}
+
+    with INDICATOR_LOCK:
+        INDICATOR_MEMO[memo_key] = {"ts": ts.copy(), "close": close.copy(), "series": series}
+        while len(INDICATOR_MEMO) > INDICATOR_MEMO_SIZE:
+            INDICATOR_MEMO.popitem(last=False)
+    return series
+
+def clean_number(value):
+    return None if value != value else round(float(value), 4)
+
+def compute_indicators(symbol, period, specs, stock_data, include_series=False):
+    """Indicator block for a /stock response"""
+    symbol = symbol.upper()
+    interval = get_interval(period)
+    bars = None
+    if BAR_STORE is not None and not stock_data.get('is_mock'):
+        bars, _ = BAR_STORE.read_locked(symbol, interval)
+
+    if bars is not None and len(bars):
+        ts, close = bars['ts'], bars['close']
+        window = len(slice_period(bars, period))
+    else:
+        # No local history (mock data or store disabled): use the response's prices
+        close = stock_closes(stock_data)
+        ts = np.arange(len(close))
+        symbol = f"{symbol}:response"
+        window = len(close)
+
+    result = {}
+    if not len(close):
+        return result
+
+    for name, params in specs:
+        label = ":".join([name] + [str(p) for p in params])
+        columns = indicator_columns(symbol, interval, name, params, ts, close)
+        public = ["macd", "signal", "histogram"] if name == "macd" else ["value"]
+        entry = {col: clean_number(columns[col][-1]) for col in public}
+        if include_series:
+            entry["series"] = {col: [clean_number(v) for v in columns[col][-window:]] for col in public}
+        result[label] = entry
+    return result
 
 # ------------------ STOCK API ------------------
+@app.route('/stocks')
+def get_stocks_route():
+    symbols = [s.strip() for s in request.args.get('symbols', '').split(',') if s.strip()]
+    period = request.args.get('period', '1mo')
+    if not symbols:
+        return jsonify({"error": "symbols parameter is required"}), 400
+    if len(symbols) > STOCKS_MAX_SYMBOLS:
+        return jsonify({"error": f"Too many symbols (max {STOCKS_MAX_SYMBOLS})"}), 400
+    compact, include = parse_stock_format()
+    return conditional_response(fetch_stocks_data_cached(symbols, period, compact, include))
+
 @app.route('/stock/<symbol>')
 def get_stock_route(symbol):
     period = request.args.get('period', '1mo')
-    data = fetch_stock_data_cached(symbol, period)
-    return jsonify(data)
+    compact, include = parse_stock_format()
+    data = fetch_stock_data_cached(symbol, period, compact, include)
+
+    # Optional server-side indicators, e.g. ?indicators=rsi:14,macd,ma:50&series=1
+    specs = parse_indicator_specs(request.args.get('indicators', ''))
+    if specs:
+        include_series = request.args.get('series', '').lower() in ('1', 'true')
+        data = dict(data, indicators=compute_indicators(symbol, period, specs, data, include_series))
+    return conditional_response(data)
+
+# ------------------ METRICS API ------------------
+@app.route('/metrics')
+def metrics():
+    """Prometheus scrape endpoint (per process: each gunicorn worker reports its own)"""
+    sentiment = SENTIMENT_CACHE.stats()
+    batcher = MODEL_BATCHER.stats()
+    gauges = [
+        ("sentiment_cache_hits_total", {}, sentiment["hits"]),
+        ("sentiment_cache_misses_total", {}, sentiment["misses"]),
+        ("sentiment_cache_evictions_total", {}, sentiment["evictions"]),
+        ("sentiment_cache_entries", {}, sentiment["size"]),
+        ("stock_cache_evictions_total", {}, STOCK_CACHE.evictions),
+        ("stock_cache_entries", {}, len(STOCK_CACHE)),
+        ("upstream_calls_total", {"upstream": "huggingface"}, HF_CLIENT.calls),
+        ("upstream_retries_total", {"upstream": "huggingface"}, HF_CLIENT.retries),
+        ("microbatch_batches_total", {}, batcher["batches"]),
+        ("microbatch_inputs_total", {}, batcher["inputs"]),
+    ]
+    limits = [(upstream, limit.stats()) for upstream, limit in (("huggingface", HF_LIMIT), ("yahoo", YAHOO_LIMIT))]
+    for name, field in (("upstream_in_flight", "in_flight"), ("upstream_rejected_total", "rejected"),
+                        ("upstream_rate_per_second", "rate_per_second"),
+                        ("upstream_circuit_opens_total", "circuit_opens")):
+        gauges.extend((name, {"upstream": upstream}, stats[field]) for upstream, stats in limits)
+    # 0 = closed, 1 = half-open, 2 = open
+    gauges.extend(("upstream_circuit_state", {"upstream": upstream}, CircuitBreaker.STATES[stats["circuit"]])
+                  for upstream, stats in limits)
+    return Response(METRICS.render(gauges), mimetype="text/plain; version=0.0.4")
+
+# ------------------ WARMUP & HEALTH ------------------
+# Each worker imports its heavy dependencies and loads the local model in a
+# background thread right after start, so it can take traffic immediately and
+# /health reports when it is fully warm. Set WARMUP=false to load on first use.
+WARMUP_ENABLED = os.environ.get("WARMUP", "true").lower() != "false"
+WARMUP_STATE = {"pid": None, "started_at": None, "finished_at": None, "seconds": None, "error": None}
+WARMUP_LOCK = threading.Lock()
+PROCESS_STARTED_AT = time.time()
+
+def warm_up():
+    """Import the lazy modules and load and exercise the local model"""
+    start = time.perf_counter()
+    try:
+        for module in LAZY_MODULES:
+            module.load()
+        if SENTIMENT_BACKEND == "onnx":
+            get_onnx_engine().predict(["Warmup"])
+    except Exception as e:
+        print(f"Warmup Error: {e}")
+        WARMUP_STATE["error"] = str(e)
+    WARMUP_STATE["seconds"] = round(time.perf_counter() - start, 3)
+    WARMUP_STATE["finished_at"] = time.time()
+    print(f"Worker {os.getpid()} warm in {WARMUP_STATE['seconds']}s")
+
+def start_warmup():
+    """Start warm_up in a background thread, once per process"""
+    if not WARMUP_ENABLED or WARMUP_STATE["pid"] == os.getpid():
+        return
+    with WARMUP_LOCK:
+        if WARMUP_STATE["pid"] == os.getpid():
+            return
+        # Threads don't survive fork(), so a forked worker starts its own
+        WARMUP_STATE.update(pid=os.getpid(), started_at=time.time(), finished_at=None, seconds=None, error=None)
+    threading.Thread(target=warm_up, daemon=True, name="warmup").start()
+
+@app.before_request
+def ensure_warmup():
+    # Covers servers without a post-fork hook (Vercel, the dev server)
+    start_warmup()
+
+def model_status():
+    if SENTIMENT_BACKEND != "onnx":
+        return "remote"
+    if ONNX_ENGINE is not None:
+        return "loaded"
+    return "error" if WARMUP_STATE["error"] else "loading"
+
+@app.route('/health')
+def health():
+    """Readiness: 200 once dependencies and model are loaded, 503 while warming"""
+    start_warmup()
+    dependencies = all(module.loaded for module in LAZY_MODULES)
+    model = model_status()
+    # Without warmup everything loads on first use, so there is nothing to wait for
+    ready = not WARMUP_ENABLED or (dependencies and model in ("remote", "loaded"))
+    return jsonify({
+        "status": "ready" if ready else ("error" if WARMUP_STATE["error"] else "warming"),
+        "pid": os.getpid(),
+        "uptime_seconds": round(time.time() - PROCESS_STARTED_AT, 3),
+        "warmup_seconds": WARMUP_STATE["seconds"],
+        "components": {
+            "dependencies": "loaded" if dependencies else "loading",
+            "model": model,
+            "huggingface": HF_LIMIT.stats()["circuit"] if SENTIMENT_BACKEND == "api" else "unused",
+            "yahoo": YAHOO_LIMIT.stats()["circuit"],
+        },
+        "error": WARMUP_STATE["error"],
+    }), 200 if ready else 503
+
+if PRELOAD_MODEL:
+    # Runs in the gunicorn master with preload_app, before workers are forked
+    for module in LAZY_MODULES:
+        module.load()
+    if SENTIMENT_BACKEND == "onnx":
+        get_onnx_engine()
 
 # ------------------ RUN SERVER ------------------
 if __name__ == '__main__':
@@ -0,0 +1,235 @@
+# ------------------ LOCAL UPSTREAM STAND-INS ------------------
+# Fakes for the two upstreams the app depends on, with configurable latency,
+# error and 429 rates and call counters:
+#   FakeInferenceServer - an HTTP server shaped like the HF inference API
+#   FakeYahoo           - a drop-in for the `yfinance` module (Ticker, download)
+import json
+import math
+import random
+import threading
+import time
+import zlib
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import pandas as pd
+
+LABELS = ("positive", "neutral", "negative")
+
+class UpstreamProfile:
+    """Latency (ms, +/-50% jitter) and failure rates for one fake upstream"""
+
+    def __init__(self, latency_ms=0.0, error_rate=0.0, rate_limit_rate=0.0, seed=0):
+        self.latency_ms = latency_ms
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.calls = Counter()
+
+    def roll(self, kind):
+        """Sleep for one call and return "ok", "error" or "rate_limited"."""
+        with self.lock:
+            delay = self.latency_ms * self.random.uniform(0.5, 1.5) / 1000
+            draw = self.random.random()
+            self.calls[kind] += 1
+        if delay:
+            time.sleep(delay)
+        if draw < self.rate_limit_rate:
+            outcome = "rate_limited"
+        elif draw < self.rate_limit_rate + self.error_rate:
+            outcome = "error"
+        else:
+            outcome = "ok"
+        with self.lock:
+            self.calls[f"{kind}:{outcome}"] += 1
+        return outcome
+
+    def stats(self):
+        with self.lock:
+            return dict(self.calls)
+
+    def reset(self):
+        with self.lock:
+            self.calls.clear()
+
+def fake_scores(text):
+    """Deterministic FinBERT-shaped [{label, score}...] for a text"""
+    seed = zlib.crc32(text.encode('utf-8'))
+    weights = [1 + (seed >> shift) % 97 for shift in (0, 8, 16)]
+    total = sum(weights)
+    scores = [{"label": label, "score": round(w / total, 6)} for label, w in zip(LABELS, weights)]
+    return sorted(scores, key=lambda s: s["score"], reverse=True)
+
+# ------------------ FAKE HF INFERENCE API ------------------
+class FakeInferenceServer:
+    """Threaded HTTP server answering POSTs like the HF text-classification API"""
+
+    def __init__(self, profile, host="127.0.0.1", port=0):
+        self.profile = profile
+        self.inputs = 0
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                outcome = fake.profile.roll("inference")
+                if outcome == "rate_limited":
+                    return self.reply(429, {"error": "Rate limit reached"}, {"Retry-After": "0"})
+                if outcome == "error":
+                    return self.reply(500, {"error": "Internal server error"})
+
+                inputs = json.loads(body).get("inputs")
+                texts = inputs if isinstance(inputs, list) else [inputs]
+                with fake.profile.lock:
+                    fake.inputs += len(texts)
+                self.reply(200, [fake_scores(t) for t in texts])
+
+            def reply(self, status, payload, headers=None):
+                data = json.dumps(payload).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://{host}:{self.server.server_address[1]}/models/fake-finbert"
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True, name="fake-hf").start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+# ------------------ FAKE YFINANCE ------------------
+INTERVAL_FREQ = {
+    '1m': '1min', '2m': '2min', '5m': '5min', '15m': '15min', '30m': '30min',
+    '60m': '60min', '90m': '90min', '1h': '60min', '1d': '1D', '5d': '5D', '1wk': '7D', '1mo': '30D',
+}
+PERIOD_DAYS = {
+    '1d': 1, '5d': 5, '1mo': 30, '3mo': 91, '6mo': 182, '1y': 365,
+    '2y': 730, '5y': 1826, '10y': 3652, 'ytd': 365, 'max': 3652,
+}
+
+class FakeYahooError(Exception):
+    pass
+
+class FakeFastInfo:
+    def __init__(self, price):
+        self.last_price = price
+        self.previous_close = round(price * 0.99, 2)
+        self.open = round(price * 0.995, 2)
+        self.day_high = round(price * 1.01, 2)
+        self.day_low = round(price * 0.98, 2)
+        self.market_cap = price * 1e9
+        self.year_high = round(price * 1.3, 2)
+        self.year_low = round(price * 0.7, 2)
+
+def fetched_once(method):
+    """Per-instance cached property. functools.cached_property before Python
+    3.12 locks per class, which would serialise every FakeTicker's first
+    fetch; yfinance's Ticker has no such lock."""
+    name = method.__name__
+
+    def get(self):
+        if name not in self.__dict__:
+            self.__dict__[name] = method(self)
+        return self.__dict__[name]
+    return property(get)
+
+class FakeTicker:
+    # Like yfinance, info/news/calendar are fetched once per Ticker object
+    def __init__(self, yahoo, symbol):
+        self.yahoo = yahoo
+        self.symbol = symbol.upper()
+
+    def call(self, kind):
+        outcome = self.yahoo.profile.roll(kind)
+        if outcome == "rate_limited":
+            raise FakeYahooError("Too Many Requests. Rate limited. Try after a while.")
+        if outcome == "error":
+            raise ConnectionError(f"Yahoo Finance unavailable for {self.symbol}")
+
+    @property
+    def fast_info(self):
+        self.call("quote")
+        return FakeFastInfo(self.yahoo.price_at(self.symbol, time.time()))
+
+    @fetched_once
+    def info(self):
+        self.call("info")
+        return {
+            "shortName": f"{self.symbol} Corp",
+            "trailingPE": 24.0,
+            "dividendYield": 0.01,
+            "averageVolume": 1_000_000,
+            "sector": "Technology",
+            "industry": "Software",
+            "website": "https://example.com",
+            "longBusinessSummary": f"{self.symbol} is a benchmark company.",
+        }
+
+    @fetched_once
+    def news(self):
+        self.call("news")
+        return [{"title": f"{self.symbol} headline {i}"} for i in range(8)]
+
+    @fetched_once
+    def calendar(self):
+        self.call("calendar")
+        return {"Earnings Date": [pd.Timestamp.now().normalize().date()]}
+
+    def history(self, period='1mo', interval='1d', start=None, **kwargs):
+        self.call("history")
+        return self.yahoo.bars(self.symbol, period, interval, start)
+
+class FakeYahoo:
+    """Module-shaped stand-in for yfinance; install with `app.yf = FakeYahoo(...)`"""
+
+    def __init__(self, profile):
+        self.profile = profile
+
+    def Ticker(self, symbol):
+        return FakeTicker(self, symbol)
+
+    def download(self, tickers, period='1mo', interval='1d', group_by='ticker', **kwargs):
+        self.profile.roll("download")
+        frames = {t: self.bars(t, period, interval, None).tz_localize(None) for t in tickers}
+        return pd.concat(frames, axis=1)
+
+    @staticmethod
+    def price_at(symbol, ts):
+        """Deterministic price path, so incremental refreshes line up with earlier bars"""
+        base = 50 + zlib.crc32(symbol.encode('utf-8')) % 450
+        phase = zlib.crc32(symbol[::-1].encode('utf-8')) % 628 / 100
+        return round(base * (1 + 0.1 * math.sin(ts / 86400 / 9 + phase)), 2)
+
+    def bars(self, symbol, period, interval, start):
+        freq = INTERVAL_FREQ.get(interval, '1D')
+        end = pd.Timestamp.now(tz='America/New_York').floor(freq if freq != '30D' else '1D')
+        begin = pd.Timestamp(start, tz='America/New_York') if start else \
+            end - pd.Timedelta(days=PERIOD_DAYS.get(period, 30))
+        index = pd.date_range(begin, end, freq=freq)
+        if len(index) == 0:
+            index = pd.DatetimeIndex([end])
+        ts = index.values.astype('datetime64[s]').astype(np.int64)
+        close = np.array([self.price_at(symbol, t) for t in ts])
+        return pd.DataFrame({
+            'Open': close * 0.998,
+            'High': close * 1.006,
+            'Low': close * 0.994,
+            'Close': close,
+            'Volume': (ts % 9973 + 1000).astype(np.int64),
+        }, index=index)
@@ -0,0 +1,360 @@
+"""Offline benchmark and load test for the Market Movement app.
+
+Runs entirely against local stand-ins (see fakes.py): nothing reaches the
+real Hugging Face or Yahoo Finance.
+
+    python bench/run.py                                  # microbenchmarks + load test
+    python bench/run.py --save bench/baseline.json       # record a baseline
+    python bench/run.py --compare bench/baseline.json    # diff against it
+
+App settings can be overridden with the usual environment variables
+(MICROBATCH, HF_BATCH_INPUTS, STOCK_CACHE_BACKEND, ...).
+"""
+import argparse
+import contextlib
+import io
+import json
+import logging
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+from fakes import FakeInferenceServer, FakeYahoo, UpstreamProfile, fake_scores
+
+COMPANIES = ["Apple", "Microsoft", "Nvidia", "Tesla", "Amazon", "Netflix", "JPMorgan", "Boeing", "Pfizer", "Disney"]
+TEMPLATES = [
+    "{c} shares surge after earnings beat expectations and record revenue growth.",
+    "{c} stock plunges as the company issues weak guidance and announces layoffs.",
+    "Analysts upgrade {c} citing strong demand; the rally could continue into next quarter.",
+    "{c} faces a lawsuit and a regulatory investigation, raising concerns about further losses.",
+    "{c} reports a steady quarter.\n\nMargins improved on lower costs and a new product launch.\n\n"
+    "But the outlook remains uncertain amid recession fears and tariff worries.",
+]
+STOCK_SYMBOLS = ["AAPL", "MSFT", "NVDA", "TSLA", "AMZN", "NFLX", "JPM", "BA", "PFE", "DIS"]
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=500, help="load test requests (default 500)")
+    parser.add_argument("--concurrency", type=int, default=32, help="load test client threads (default 32)")
+    parser.add_argument("--stock-ratio", type=float, default=0.3, help="share of load requests hitting /stock (default 0.3)")
+    parser.add_argument("--distinct-texts", type=int, default=50, help="distinct texts in the workload (default 50)")
+    parser.add_argument("--iterations", type=int, default=2000, help="iterations per CPU microbenchmark (default 2000)")
+    parser.add_argument("--hf-latency-ms", type=float, default=80)
+    parser.add_argument("--hf-error-rate", type=float, default=0.0)
+    parser.add_argument("--hf-429-rate", type=float, default=0.0)
+    parser.add_argument("--yahoo-latency-ms", type=float, default=60)
+    parser.add_argument("--yahoo-error-rate", type=float, default=0.0)
+    parser.add_argument("--yahoo-429-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--skip-micro", action="store_true")
+    parser.add_argument("--skip-load", action="store_true")
+    parser.add_argument("--save", metavar="PATH", help="write results as a JSON baseline")
+    parser.add_argument("--compare", metavar="PATH", help="diff results against a saved baseline")
+    parser.add_argument("--verbose", action="store_true", help="show the app's own log output")
+    return parser.parse_args()
+
+def configure_env(hf_url, bar_dir):
+    """Point the app at the fakes; explicit environment settings win"""
+    os.environ["HF_API_URL"] = hf_url
+    os.environ.setdefault("HF_API_TOKEN", "bench")
+    os.environ.setdefault("SENTIMENT_BACKEND", "api")
+    os.environ.setdefault("STOCK_CACHE_BACKEND", "memory")
+    os.environ.setdefault("BAR_STORE_DIR", bar_dir)
+    os.environ.setdefault("HF_BACKOFF_SECONDS", "0.05")
+    os.environ["WARM_TICKERS"] = ""
+
+def make_corpus(count, rng):
+    texts = []
+    for i in range(count):
+        text = rng.choice(TEMPLATES).format(c=rng.choice(COMPANIES))
+        texts.append(text if i < len(TEMPLATES) * len(COMPANIES) else f"{text} (update {i})")
+    return texts
+
+def summarize(samples, wall=None):
+    """Latency percentiles in ms for a list of durations in seconds"""
+    if not samples:
+        return {"count": 0}
+    ordered = sorted(samples)
+    pick = lambda q: ordered[min(len(ordered) - 1, int(len(ordered) * q))] * 1000
+    result = {
+        "count": len(ordered),
+        "mean_ms": round(sum(ordered) / len(ordered) * 1000, 3),
+        "p50_ms": round(pick(0.50), 3),
+        "p95_ms": round(pick(0.95), 3),
+        "p99_ms": round(pick(0.99), 3),
+        "max_ms": round(ordered[-1] * 1000, 3),
+    }
+    if wall:
+        result["ops_per_sec"] = round(len(ordered) / wall, 1)
+    return result
+
+def timed_calls(fn, args_list, warmup=False):
+    if warmup:
+        fn(*args_list[0])  # fill caches so only hits are timed
+    samples = []
+    start = time.perf_counter()
+    for args in args_list:
+        t0 = time.perf_counter()
+        fn(*args)
+        samples.append(time.perf_counter() - t0)
+    return summarize(samples, time.perf_counter() - start)
+
+class Instruments:
+    """Counts stock tier outcomes and mock fallbacks by wrapping app functions"""
+
+    def __init__(self, app):
+        self.app = app
+        self.lock = threading.Lock()
+        self.tiers = Counter()
+        self.mock_fallbacks = 0
+        get_tier, generate_mock_data = app.get_tier, app.generate_mock_data
+
+        def counted_get_tier(*args):
+            try:
+                value, state = get_tier(*args)
+            except Exception:
+                self.count_tier("error")
+                raise
+            self.count_tier(state)
+            return value, state
+
+        def counted_mock(*args, **kwargs):
+            with self.lock:
+                self.mock_fallbacks += 1
+            return generate_mock_data(*args, **kwargs)
+
+        app.get_tier = counted_get_tier
+        app.generate_mock_data = counted_mock
+
+    def count_tier(self, state):
+        with self.lock:
+            self.tiers[state] += 1
+
+    def reset(self, hf_profile, yahoo_profile, hf_server):
+        """Cold caches and zeroed counters for the next phase"""
+        app = self.app
+        app.SENTIMENT_CACHE = app.SentimentCache(app.SENTIMENT_CACHE_SIZE, app.SENTIMENT_CACHE_TTL)
+        app.STOCK_CACHE = app.create_stock_cache()
+        app.HF_CLIENT = app.HFClient(app.HF_API_URL, app.HF_API_TOKEN)
+        app.HF_LIMIT = app.UpstreamLimit("Hugging Face", app.HF_MAX_CONCURRENCY,
+                                         app.HF_RATE_PER_SECOND, app.HF_RATE_BURST)
+        app.YAHOO_LIMIT = app.UpstreamLimit("Yahoo Finance", app.YAHOO_MAX_CONCURRENCY,
+                                            app.YAHOO_RATE_PER_SECOND, app.YAHOO_RATE_BURST)
+        with self.lock:
+            self.tiers.clear()
+            self.mock_fallbacks = 0
+        hf_profile.reset()
+        yahoo_profile.reset()
+        hf_server.inputs = 0
+        self.batcher_before = app.MODEL_BATCHER.stats()
+
+    def snapshot(self, hf_profile, yahoo_profile, hf_server):
+        app = self.app
+        with self.lock:
+            tiers = dict(self.tiers)
+            mock_fallbacks = self.mock_fallbacks
+        tier_reads = sum(tiers.values())
+        batcher = app.MODEL_BATCHER.stats()
+        batches = batcher["batches"] - self.batcher_before["batches"]
+        inputs = batcher["inputs"] - self.batcher_before["inputs"]
+        return {
+            "upstream": {
+                "hf": dict(hf_profile.stats(), inputs=hf_server.inputs),
+                "yahoo": yahoo_profile.stats(),
+            },
+            "hf_client": app.HF_CLIENT.stats(),
+            "guards": {"hf": app.HF_LIMIT.stats(), "yahoo": app.YAHOO_LIMIT.stats()},
+            "sentiment_cache": app.SENTIMENT_CACHE.stats(),
+            "stock_tiers": dict(tiers, hit_rate=round(
+                (tiers.get("cached", 0) + tiers.get("stale", 0)) / tier_reads, 4) if tier_reads else 0.0),
+            "microbatch": {"batches": batches, "inputs": inputs,
+                           "avg_batch_size": round(inputs / batches, 2) if batches else 0.0},
+            "mock_fallbacks": mock_fallbacks,
+        }
+
+# ------------------ MICROBENCHMARKS ------------------
+def run_micro(app, args, corpus, instruments, fakes, bar_dir):
+    rng = random.Random(args.seed)
+    texts = [rng.choice(corpus) for _ in range(args.iterations)]
+    results = {}
+
+    results["extract_ticker"] = timed_calls(app.extract_ticker, [(t,) for t in texts])
+
+    def impact(text):
+        top = fake_scores(text)[0]
+        scores = {s["label"]: s["score"] for s in fake_scores(text)}
+        app.calculate_impact_score(text, top["label"], top["score"] * 100, scores)
+    results["calculate_impact_score"] = timed_calls(impact, [(t,) for t in texts])
+
+    io_iterations = max(10, args.iterations // 50)
+    symbols = [STOCK_SYMBOLS[i % len(STOCK_SYMBOLS)] for i in range(io_iterations)]
+
+    bar_store = app.BAR_STORE
+    def cold_stock(symbol):
+        # An empty cache and bar store, so every call downloads full history
+        app.STOCK_CACHE = app.create_stock_cache()
+        if bar_store is not None:
+            app.BAR_STORE = app.BarStore(tempfile.mkdtemp(prefix="cold_", dir=bar_dir))
+        app.fetch_stock_data_cached(symbol, '1mo')
+    instruments.reset(*fakes)
+    results["fetch_stock_data_cached_miss"] = timed_calls(cold_stock, [(s,) for s in symbols])
+    app.BAR_STORE = bar_store
+    results["fetch_stock_data_cached_hit"] = timed_calls(
+        app.fetch_stock_data_cached, [(STOCK_SYMBOLS[0], '1mo')] * args.iterations, warmup=True)
+
+    client = app.app.test_client()
+    def analyze(text, cold):
+        if cold:
+            app.SENTIMENT_CACHE = app.SentimentCache(app.SENTIMENT_CACHE_SIZE, app.SENTIMENT_CACHE_TTL)
+        client.post('/analyze', json={"text": text})
+    instruments.reset(*fakes)
+    results["analyze_cold"] = timed_calls(analyze, [(t, True) for t in texts[:io_iterations]])
+    results["analyze_warm"] = timed_calls(analyze, [(texts[0], False)] * io_iterations, warmup=True)
+    return results
+
+# ------------------ LOAD TEST ------------------
+def run_load(app, args, corpus, instruments, fakes):
+    import requests
+    from werkzeug.serving import make_server
+
+    server = make_server("127.0.0.1", 0, app.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True, name="bench-app").start()
+    base_url = f"http://127.0.0.1:{server.server_port}"
+
+    rng = random.Random(args.seed)
+    plan = []
+    for _ in range(args.requests):
+        if rng.random() < args.stock_ratio:
+            plan.append(("stock", rng.choice(STOCK_SYMBOLS)))
+        else:
+            plan.append(("analyze", rng.choice(corpus)))
+
+    local = threading.local()
+    lock = threading.Lock()
+    latencies = {"analyze": [], "stock": []}
+    statuses = Counter()
+
+    def send(item):
+        kind, value = item
+        session = getattr(local, 'session', None)
+        if session is None:
+            session = local.session = requests.Session()
+        t0 = time.perf_counter()
+        try:
+            if kind == "stock":
+                response = session.get(f"{base_url}/stock/{value}?period=1mo", timeout=60)
+            else:
+                response = session.post(f"{base_url}/analyze", json={"text": value}, timeout=60)
+            status = response.status_code
+        except requests.RequestException:
+            status = "connection_error"
+        elapsed = time.perf_counter() - t0
+        with lock:
+            latencies[kind].append(elapsed)
+            statuses[f"{kind}:{status}"] += 1
+
+    instruments.reset(*fakes)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        list(pool.map(send, plan))
+    wall = time.perf_counter() - start
+    server.shutdown()
+
+    return {
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "wall_seconds": round(wall, 3),
+        "throughput_rps": round(args.requests / wall, 1),
+        "latency": {
+            "all": summarize(latencies["analyze"] + latencies["stock"]),
+            "analyze": summarize(latencies["analyze"]),
+            "stock": summarize(latencies["stock"]),
+        },
+        "statuses": dict(statuses),
+        **instruments.snapshot(*fakes),
+    }
+
+# ------------------ REPORTING ------------------
+def flatten(data, prefix=""):
+    items = {}
+    for key, value in data.items():
+        path = f"{prefix}{key}"
+        if isinstance(value, dict):
+            items.update(flatten(value, path + "."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            items[path] = value
+    return items
+
+def print_report(results):
+    for section in ("micro", "load"):
+        if section not in results:
+            continue
+        print(f"\n== {section} ==")
+        for key, value in flatten(results[section]).items():
+            print(f"  {key:<55} {value}")
+
+def print_comparison(results, baseline):
+    print(f"\n== compared with baseline from {baseline.get('meta', {}).get('created', '?')} ==")
+    current = flatten({k: v for k, v in results.items() if k != "meta"})
+    previous = flatten({k: v for k, v in baseline.items() if k != "meta"})
+    for key in sorted(set(current) & set(previous)):
+        before, after = previous[key], current[key]
+        change = f"{(after - before) / before * 100:+.1f}%" if before else "n/a"
+        print(f"  {key:<55} {before:>12} -> {after:<12} {change}")
+
+def main():
+    args = parse_args()
+    hf_profile = UpstreamProfile(args.hf_latency_ms, args.hf_error_rate, args.hf_429_rate, args.seed)
+    yahoo_profile = UpstreamProfile(args.yahoo_latency_ms, args.yahoo_error_rate, args.yahoo_429_rate, args.seed + 1)
+    hf_server = FakeInferenceServer(hf_profile).start()
+    bar_dir = tempfile.mkdtemp(prefix="bench_bars_")
+    try:
+        configure_env(hf_server.url, bar_dir)
+
+        log = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO())
+        if not args.verbose:
+            logging.getLogger('werkzeug').setLevel(logging.ERROR)
+        with log:
+            import app
+            app.yf = FakeYahoo(yahoo_profile)
+            instruments = Instruments(app)
+            fakes = (hf_profile, yahoo_profile, hf_server)
+            corpus = make_corpus(args.distinct_texts, random.Random(args.seed))
+
+            results = {"meta": {
+                "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "args": {k: v for k, v in vars(args).items() if k not in ("save", "compare", "verbose")},
+            }}
+            if not args.skip_micro:
+                results["micro"] = run_micro(app, args, corpus, instruments, fakes, bar_dir)
+            if not args.skip_load:
+                results["load"] = run_load(app, args, corpus, instruments, fakes)
+    finally:
+        hf_server.stop()
+        shutil.rmtree(bar_dir, ignore_errors=True)
+
+    print_report(results)
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            print_comparison(results, json.load(f))
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+        print(f"\nSaved baseline to {args.save}")
+
+if __name__ == '__main__':
+    main()
@@ -17,6 +17,7 @@ document.addEventListener('DOMContentLoaded', function () {
     let stockChart = null;
     let currentSymbol = null;
     let currentPeriod = '1mo';
+    let detailsSymbol = null; // symbol whose news and earnings are on screen
 
     // ==================== STOCK SEARCH ====================
     const searchInput = document.getElementById('stock-search');
@@ -48,11 +49,61 @@ document.addEventListener('DOMContentLoaded', function () {
     });
 
     // ==================== LOAD STOCK DATA ====================
+    // Computed server-side over the full cached history (see loadTechnicalIndicators)
+    const SERVER_INDICATORS = 'rsi:14,macd:12:26:9,ma:20,ma:50,ma:200';
+
+    const pad2 = n => (n < 10 ? '0' : '') + n;
+
+    // YYYY-MM-DD for days since 1970-01-01, with integer math (much faster than Date)
+    function civilDate(days) {
+        const z = days + 719468, era = Math.floor(z / 146097), doe = z - era * 146097;
+        const yoe = Math.floor((doe - Math.floor(doe / 1460) + Math.floor(doe / 36524) - Math.floor(doe / 146096)) / 365);
+        const doy = doe - (365 * yoe + Math.floor(yoe / 4) - Math.floor(yoe / 100));
+        const mp = Math.floor((5 * doy + 2) / 153);
+        const day = doy - Math.floor((153 * mp + 2) / 5) + 1;
+        const month = mp < 10 ? mp + 3 : mp - 9;
+        return `${yoe + era * 400 + (month <= 2 ? 1 : 0)}-${pad2(month)}-${pad2(day)}`;
+    }
+
+    // Compact responses carry OHLCV as delta-encoded fixed-point columns:
+    // a running sum per column, divided by its scale, restores the values
+    function decodeBars(data) {
+        const bars = data.bars;
+        const columns = {};
+        for (const [name, deltas] of Object.entries(bars.columns)) {
+            const scale = bars.scale[name];
+            const values = new Array(deltas.length);
+            let total = 0;
+            for (let i = 0; i < deltas.length; i++) {
+                total += deltas[i];
+                values[i] = total / scale;
+            }
+            columns[name] = values;
+        }
+        // Timestamps are exchange-local wall clock seconds, labelled as-is
+        const intraday = /[mh]$/.test(bars.interval);
+        data.dates = columns.t.map(t => {
+            const days = Math.floor(t / 86400);
+            if (!intraday) return civilDate(days);
+            const seconds = t - days * 86400;
+            return `${civilDate(days)} ${pad2(Math.floor(seconds / 3600))}:${pad2(Math.floor(seconds % 3600 / 60))}`;
+        });
+        // Only set the series the server sent, like the full format's keys
+        const keys = { close: 'prices', open: 'open', high: 'high', low: 'low', volume: 'volume' };
+        for (const [column, key] of Object.entries(keys)) {
+            if (columns[column]) data[key] = columns[column];
+        }
+        return data;
+    }
+
     async function loadStockData(symbol) {
         currentSymbol = symbol;
+        // News and earnings don't depend on the period, so only fetch them for a new symbol
+        const withDetails = symbol !== detailsSymbol;
 
         try {
-            const response = await fetch(`/stock/${symbol}?period=${currentPeriod}`);
+            const include = withDetails ? 'news,earnings' : '';
+            const response = await fetch(`/stock/${symbol}?period=${currentPeriod}&indicators=${SERVER_INDICATORS}&format=compact&include=${include}`);
             const data = await response.json();
 
             if (data.error) {
@@ -61,6 +112,8 @@ document.addEventListener('DOMContentLoaded', function () {
                 return;
             }
 
+            decodeBars(data);
+
             // Update header
             document.getElementById('current-symbol').textContent = data.symbol;
             document.getElementById('current-name').textContent = data.name;
@@ -85,7 +138,10 @@ document.addEventListener('DOMContentLoaded', function () {
             // ===== NEW FEATURES =====
             updateKeyStatistics(data);
             updateRiskAndSummary(data); // New function
-            updateEarningsAndNews(data);
+            if (withDetails) {
+                updateEarningsAndNews(data);
+                detailsSymbol = symbol;
+            }
 
             // Update data freshness
             document.getElementById('data-freshness').textContent = new Date().toLocaleTimeString();
@@ -284,9 +340,10 @@ document.addEventListener('DOMContentLoaded', function () {
 
     // ==================== TECHNICAL INDICATORS ====================
     function loadTechnicalIndicators(symbol, data) {
-        // Calculate RSI (simplified calculation)
+        // Prefer server-computed indicators, fall back to the simplified local ones
+        const server = data.indicators || {};
         const prices = data.prices;
-        const rsi = calculateRSI(prices, 14);
+        const rsi = server['rsi:14']?.value ?? calculateRSI(prices, 14);
 
         document.getElementById('rsi-value').textContent = rsi.toFixed(1);
         document.getElementById('rsi-marker').style.left = rsi + '%';
@@ -304,7 +361,7 @@ document.addEventListener('DOMContentLoaded', function () {
         }
 
         // Calculate MACD (simplified)
-        const macd = calculateMACD(prices);
+        const macd = server['macd:12:26:9'] ?? calculateMACD(prices);
         document.getElementById('macd-value').textContent = macd.macd.toFixed(2);
         document.getElementById('macd-signal-value').textContent = macd.signal.toFixed(2);
         document.getElementById('macd-histogram').textContent = macd.histogram.toFixed(2);
@@ -320,9 +377,9 @@ document.addEventListener('DOMContentLoaded', function () {
 
         // Calculate Moving Averages
         const currentPrice = prices[prices.length - 1];
-        const ma20 = calculateMA(prices, 20);
-        const ma50 = calculateMA(prices, Math.min(50, prices.length));
-        const ma200 = calculateMA(prices, Math.min(200, prices.length));
+        const ma20 = server['ma:20']?.value ?? calculateMA(prices, 20);
+        const ma50 = server['ma:50']?.value ?? calculateMA(prices, Math.min(50, prices.length));
+        const ma200 = server['ma:200']?.value ?? calculateMA(prices, Math.min(200, prices.length));
 
         document.getElementById('ma20-value').textContent = '$' + ma20.toFixed(2);
         document.getElementById('ma50-value').textContent = '$' + ma50.toFixed(2);
@@ -471,60 +528,74 @@ document.addEventListener('DOMContentLoaded', function () {
     let comparisonStocks = [];
 
     addComparisonBtn.addEventListener('click', () => {
-        const symbol = prompt('Enter stock symbol to compare:');
-        if (symbol && !comparisonStocks.includes(symbol.toUpperCase())) {
-            addComparisonStock(symbol.toUpperCase());
+        const input = prompt('Enter stock symbol(s) to compare (comma separated):');
+        if (!input) return;
+
+        const symbols = input.split(',')
+            .map(s => s.trim().toUpperCase())
+            .filter(s => s && !comparisonStocks.includes(s));
+        if (symbols.length) {
+            addComparisonStocks([...new Set(symbols)]);
         }
     });
 
-    async function addComparisonStock(symbol) {
+    // One /stocks round-trip for every symbol being added
+    async function addComparisonStocks(symbols) {
         try {
-            const response = await fetch(`/stock/${symbol}?period=1mo`);
-            const data = await response.json();
+            const response = await fetch(`/stocks?symbols=${encodeURIComponent(symbols.join(','))}&period=1mo&format=compact`);
+            const results = await response.json();
 
-            if (data.error) {
-                alert('Stock not found: ' + symbol);
+            if (results.error) {
+                alert('Comparison failed: ' + results.error);
                 return;
             }
 
-            comparisonStocks.push(symbol);
-
-            // Clear empty state
-            const empty = comparisonContainer.querySelector('.comparison-empty');
-            if (empty) empty.remove();
-
-            // Create comparison card
-            const card = document.createElement('div');
-            card.className = 'panel';
-            card.innerHTML = `
-                <div class="panel-header">
-                    <h3>${data.symbol}</h3>
-                    <button class="remove-btn" data-symbol="${symbol}">×</button>
-                </div>
-                <div class="price-display" style="margin-bottom: 0;">
-                    <span class="stock-price" style="font-size: 1.5rem;">$${data.price.toFixed(2)}</span>
-                    <span class="change-badge ${data.change >= 0 ? 'positive' : 'negative'}">
-                        ${data.change >= 0 ? '+' : ''}${data.changePercent.toFixed(2)}%
-                    </span>
-                </div>
-                <p style="color: var(--text-muted); font-size: 0.85rem; margin-top: 8px;">${data.name}</p>
-            `;
-
-            card.querySelector('.remove-btn').addEventListener('click', () => {
-                comparisonStocks = comparisonStocks.filter(s => s !== symbol);
-                card.remove();
-                if (comparisonStocks.length === 0) {
-                    comparisonContainer.innerHTML = '<div class="comparison-empty"><p>Add stocks above to compare</p></div>';
-                }
-            });
-
-            comparisonContainer.appendChild(card);
-
+            symbols.forEach(symbol => addComparisonCard(symbol, results[symbol]));
         } catch (error) {
             console.error('Error adding comparison:', error);
         }
     }
 
+    function addComparisonCard(symbol, data) {
+        if (!data || data.error) {
+            alert('Stock not found: ' + symbol);
+            return;
+        }
+
+        comparisonStocks.push(symbol);
+
+        // Clear empty state
+        const empty = comparisonContainer.querySelector('.comparison-empty');
+        if (empty) empty.remove();
+
+        // Create comparison card
+        const card = document.createElement('div');
+        card.className = 'panel';
+        card.innerHTML = `
+            <div class="panel-header">
+                <h3>${data.symbol}</h3>
+                <button class="remove-btn" data-symbol="${symbol}">×</button>
+            </div>
+            <div class="price-display" style="margin-bottom: 0;">
+                <span class="stock-price" style="font-size: 1.5rem;">$${data.price.toFixed(2)}</span>
+                <span class="change-badge ${data.change >= 0 ? 'positive' : 'negative'}">
+                    ${data.change >= 0 ? '+' : ''}${data.changePercent.toFixed(2)}%
+                </span>
+            </div>
+            <p style="color: var(--text-muted); font-size: 0.85rem; margin-top: 8px;">${data.name}</p>
+        `;
+
+        card.querySelector('.remove-btn').addEventListener('click', () => {
+            comparisonStocks = comparisonStocks.filter(s => s !== symbol);
+            card.remove();
+            if (comparisonStocks.length === 0) {
+                comparisonContainer.innerHTML = '<div class="comparison-empty"><p>Add stocks above to compare</p></div>';
+            }
+        });
+
+        comparisonContainer.appendChild(card);
+    }
+
     // ==================== EXPORT ====================
     document.getElementById('export-pdf')?.addEventListener('click', () => {
         alert('PDF export coming soon! Use browser print for now.');
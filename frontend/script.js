@@ -41,72 +41,30 @@ document.addEventListener('DOMContentLoaded', function () {
         analyzeBtn.classList.add('loading');
 
         try {
-            const response = await fetch("/analyze", {
+            // Streamed: summary arrives after one model call, trend and stock follow
+            const response = await fetch("/analyze?stream=ndjson", {
                 method: "POST",
                 headers: { "Content-Type": "application/json" },
                 body: JSON.stringify({ text })
             });
 
-            analysisData = await response.json();
-
-            // Handle API Errors (Missing Token or Model Loading)
-            if (analysisData.error) {
-                alert('AI Error: ' + analysisData.error);
-                // Also log to console for debugging
-                console.error('Backend Error:', analysisData.error);
+            const contentType = response.headers.get('Content-Type') || '';
+            if (!contentType.includes('application/x-ndjson')) {
+                // Validation/config errors come back as a plain JSON body
+                const data = await response.json();
+                if (data.error) {
+                    showAnalysisError(data.error);
+                } else {
+                    analysisData = data;
+                    renderSummary(data);
+                    renderTrend(data.trend);
+                    renderStock(data.stock);
+                }
                 return;
             }
 
-            // Show results
-            resultsSection.style.display = 'block';
-
-            // Update sentiment metrics
-            document.getElementById("sentiment").textContent = analysisData.sentiment;
-            document.getElementById("confidence").textContent = analysisData.confidence + '%';
-            document.getElementById("confidence-level").textContent = analysisData.confidenceLevel.level;
-            document.getElementById("confidence-level").style.color = analysisData.confidenceLevel.color;
-            document.getElementById("prediction").textContent = analysisData.prediction;
-
-            // Impact score
-            document.getElementById("impact-score").textContent =
-                (analysisData.impact.score > 0 ? '+' : '') + analysisData.impact.score;
-            document.getElementById("impact-level").textContent = analysisData.impact.level;
-
-            // Update gauge
-            updateGauge(analysisData.impact.score);
-
-            // AI Insight
-            document.getElementById("ai-insight").textContent = analysisData.insight;
-
-            // Trend badge
-            const trendBadge = document.getElementById("trend-badge");
-            if (analysisData.trend) {
-                trendBadge.textContent = `${analysisData.trend.emoji} ${analysisData.trend.trend}: ${analysisData.trend.previous} → ${analysisData.trend.current}`;
-                trendBadge.className = 'trend-badge ' + analysisData.trend.trend.toLowerCase();
-                trendBadge.style.display = 'block';
-            } else {
-                trendBadge.style.display = 'none';
-            }
-
-            // Stock data
-            const stockInfo = document.getElementById("stock-info");
-            if (analysisData.stock) {
-                document.getElementById("stock-symbol").textContent = analysisData.stock.symbol;
-                document.getElementById("stock-name").textContent = analysisData.stock.name;
-                document.getElementById("stock-price").textContent = `$${analysisData.stock.price.toFixed(2)}`;
-
-                const changeEl = document.getElementById("stock-change");
-                const isPositive = analysisData.stock.change >= 0;
-                changeEl.textContent = `${isPositive ? '+' : ''}${analysisData.stock.change.toFixed(2)} (${isPositive ? '+' : ''}${analysisData.stock.changePercent.toFixed(2)}%)`;
-                changeEl.className = `change-badge ${isPositive ? 'positive' : 'negative'}`;
-
-                stockInfo.style.display = 'block';
-            } else {
-                stockInfo.style.display = 'none';
-            }
-
-            // Scroll to results
-            resultsSection.scrollIntoView({ behavior: 'smooth', block: 'start' });
+            analysisData = null;
+            await readEventStream(response, handleAnalysisEvent);
 
         } catch (error) {
             console.error('Error:', error);
@@ -117,6 +75,118 @@ document.addEventListener('DOMContentLoaded', function () {
         }
     });
 
+    // ==================== STREAM HANDLING ====================
+    async function readEventStream(response, onEvent) {
+        const decoder = new TextDecoder();
+        let buffer = '';
+
+        const flushLines = () => {
+            const lines = buffer.split('\n');
+            buffer = lines.pop();
+            lines.filter(line => line.trim()).forEach(line => onEvent(JSON.parse(line)));
+        };
+
+        if (!response.body || !response.body.getReader) {
+            buffer = await response.text() + '\n';
+            flushLines();
+            return;
+        }
+
+        const reader = response.body.getReader();
+        while (true) {
+            const { done, value } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true });
+            flushLines();
+        }
+        buffer += decoder.decode() + '\n';
+        flushLines();
+    }
+
+    function handleAnalysisEvent({ event, data }) {
+        switch (event) {
+            case 'summary':
+                analysisData = { ...data, trend: null, stock: null };
+                renderSummary(data);
+                // Clear sections from the previous analysis until theirs arrive
+                renderTrend(null);
+                renderStock(null);
+                resultsSection.scrollIntoView({ behavior: 'smooth', block: 'start' });
+                break;
+            case 'trend':
+                if (analysisData) analysisData.trend = data;
+                renderTrend(data);
+                break;
+            case 'stock':
+                if (analysisData) analysisData.stock = data;
+                renderStock(data);
+                break;
+            case 'error':
+                showAnalysisError(data.error);
+                break;
+        }
+    }
+
+    function showAnalysisError(message) {
+        // Handle API Errors (Missing Token or Model Loading)
+        alert('AI Error: ' + message);
+        // Also log to console for debugging
+        console.error('Backend Error:', message);
+    }
+
+    // ==================== RESULT RENDERING ====================
+    function renderSummary(data) {
+        // Show results
+        resultsSection.style.display = 'block';
+
+        // Update sentiment metrics
+        document.getElementById("sentiment").textContent = data.sentiment;
+        document.getElementById("confidence").textContent = data.confidence + '%';
+        document.getElementById("confidence-level").textContent = data.confidenceLevel.level;
+        document.getElementById("confidence-level").style.color = data.confidenceLevel.color;
+        document.getElementById("prediction").textContent = data.prediction;
+
+        // Impact score
+        document.getElementById("impact-score").textContent =
+            (data.impact.score > 0 ? '+' : '') + data.impact.score;
+        document.getElementById("impact-level").textContent = data.impact.level;
+
+        // Update gauge
+        updateGauge(data.impact.score);
+
+        // AI Insight
+        document.getElementById("ai-insight").textContent = data.insight;
+    }
+
+    function renderTrend(trend) {
+        const trendBadge = document.getElementById("trend-badge");
+        if (trend) {
+            trendBadge.textContent = `${trend.emoji} ${trend.trend}: ${trend.previous} → ${trend.current}`;
+            trendBadge.className = 'trend-badge ' + trend.trend.toLowerCase();
+            trendBadge.style.display = 'block';
+        } else {
+            trendBadge.style.display = 'none';
+        }
+    }
+
+    function renderStock(stock) {
+        const stockInfo = document.getElementById("stock-info");
+        if (stock) {
+            document.getElementById("stock-symbol").textContent = stock.symbol;
+            document.getElementById("stock-name").textContent = stock.name;
+            document.getElementById("stock-price").textContent = `$${stock.price.toFixed(2)}`;
+
+            const changeEl = document.getElementById("stock-change");
+            const isPositive = stock.change >= 0;
+            changeEl.textContent = `${isPositive ? '+' : ''}${stock.change.toFixed(2)} (${isPositive ? '+' : ''}${stock.changePercent.toFixed(2)}%)`;
+            changeEl.className = `change-badge ${isPositive ? 'positive' : 'negative'}`;
+
+            stockInfo.style.display = 'block';
+        } else {
+            stockInfo.style.display = 'none';
+        }
+    }
+
     // ==================== GAUGE UPDATE ====================
     function updateGauge(score) {
         const marker = document.getElementById('gauge-marker');
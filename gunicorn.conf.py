@@ -0,0 +1,23 @@
+# Gunicorn settings, picked up automatically by `gunicorn app:app`
+# (Procfile and Dockerfile).
+#
+# The app spends nearly all of its time waiting on the Hugging Face and
+# Yahoo Finance sockets, so each worker runs many threads instead of one
+# request at a time. Upstream calls are still capped per process by
+# HF_MAX_CONCURRENCY / YAHOO_MAX_CONCURRENCY in app.py.
+import os
+
+worker_class = os.environ.get("GUNICORN_WORKER_CLASS", "gthread")
+workers = int(os.environ.get("WEB_CONCURRENCY", 1))
+threads = int(os.environ.get("WEB_THREADS", 256))
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 60))
+keepalive = 5
+
+# PRELOAD_MODEL=true imports the app (heavy modules and the local model) once
+# in the master, so forked workers share that memory copy-on-write and start
+# warm. Otherwise each worker starts fast and warms up in the background.
+preload_app = os.environ.get("PRELOAD_MODEL", "false").lower() == "true"
+
+def post_worker_init(worker):
+    import app
+    app.start_warmup()